@@ -289,65 +289,65 @@ class ParallelTransferrer:
     async def finish_upload(self) -> None:
         await self._cleanup()
 
-    async def download(
-        self,
-        file: TypeLocation,
-        file_size: int,
-        part_size_kb: Optional[float] = None,
-        connection_count: Optional[int] = None,
-    ) -> AsyncGenerator[bytes, None]:
-        if not part_size_kb:
-            part_size_kb = 512
-        
-        if not connection_count:
-            connection_count = self._get_connection_count(file_size)
-            connection_count = max(2, min(connection_count, 20))
-        
-        part_size = int(part_size_kb * 1024)
-        part_count = math.ceil(file_size / part_size)
-        
-        await self._init_download(connection_count, file, part_count, part_size)
-
-        part = 0
-        while part < part_count:
-            tasks = []
-            # 只启动剩余块数需要的 sender
-            remaining_parts = part_count - part
-            num_to_start = min(len(self.senders), remaining_parts)
-            active_senders = self.senders[:num_to_start]
-            
-            for sender in active_senders:
-                tasks.append(self.loop.create_task(sender.next()))
-            
-            try:
-                for i, task in enumerate(tasks):
-                    try:
-                        data = await task
-                        if not data:
-                            # 如果没有数据，停止所有其他任务
-                            for j, other_task in enumerate(tasks):
-                                if j != i and not other_task.done():
-                                    other_task.cancel()
-                            break
-                        yield data
-                        part += 1
-                    except asyncio.CancelledError:
-                        # 当前任务被取消，传播给所有其他任务
-                        for other_task in tasks:
-                            if not other_task.done():
-                                other_task.cancel()
-                        raise
-            except (GeneratorExit, Exception):
-                # 遇到任何错误（包括外部取消），立即取消当前正在运行的所有任务
-                for task in tasks:
-                    if not task.done():
-                        task.cancel()
-                # 等待任务取消完成，防止 "Task was destroyed but it is pending"
-                await asyncio.gather(*tasks, return_exceptions=True)
-                raise
-        
-        # 正常结束后，清理连接
-        await self._cleanup()
+    async def download(
+        self,
+        file: TypeLocation,
+        file_size: int,
+        part_size_kb: Optional[float] = None,
+        connection_count: Optional[int] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        if not part_size_kb:
+            part_size_kb = 512
+        
+        if not connection_count:
+            connection_count = self._get_connection_count(file_size)
+            connection_count = max(2, min(connection_count, 20))
+        
+        part_size = int(part_size_kb * 1024)
+        part_count = math.ceil(file_size / part_size)
+        
+        await self._init_download(connection_count, file, part_count, part_size)
+
+        part = 0
+        while part < part_count:
+            tasks = []
+            # 只启动剩余块数需要的 sender
+            remaining_parts = part_count - part
+            num_to_start = min(len(self.senders), remaining_parts)
+            active_senders = self.senders[:num_to_start]
+            
+            for sender in active_senders:
+                tasks.append(self.loop.create_task(sender.next()))
+            
+            try:
+                for i, task in enumerate(tasks):
+                    try:
+                        data = await task
+                        if not data:
+                            # 如果没有数据，停止所有其他任务
+                            for j, other_task in enumerate(tasks):
+                                if j != i and not other_task.done():
+                                    other_task.cancel()
+                            break
+                        yield data
+                        part += 1
+                    except asyncio.CancelledError:
+                        # 当前任务被取消，传播给所有其他任务
+                        for other_task in tasks:
+                            if not other_task.done():
+                                other_task.cancel()
+                        raise
+            except (GeneratorExit, Exception):
+                # 遇到任何错误（包括外部取消），立即取消当前正在运行的所有任务
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
+                # 等待任务取消完成，防止 "Task was destroyed but it is pending"
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        
+        # 正常结束后，清理连接
+        await self._cleanup()
 
 parallel_transfer_locks: DefaultDict[int, asyncio.Lock] = defaultdict(
     lambda: asyncio.Lock()
@@ -403,89 +403,104 @@ async def _internal_transfer_to_telegram(
         return InputFile(file_id, part_count, filename, hash_md5.hexdigest()), file_size
 
 
-DEFAULT_CONNECTION_COUNT = 16
-
-async def download_file(
-    client: TelegramClient,
-    location: TypeLocation,
-    out: BinaryIO,
-    file_size: int = None,
-    progress_callback: callable = None,
-    dc_id: int = None,
-    retry_count: int = 0,
-    max_retries: int = 3,
-    connection_count: int = DEFAULT_CONNECTION_COUNT,
-) -> BinaryIO:
-    if file_size is None:
-        if hasattr(location, 'size'):
-            file_size = location.size
-        else:
-            raise TypeError("file_size must be specified for this location type")
-
-    if dc_id is None:
-        dc_id, location = utils.get_input_location(location)
-
-    # 声明 downloader 变量，以便在 finally 块中访问
-    downloader = None
-
-    try:
-        downloader = ParallelTransferrer(client, dc_id)
-        
-        # 启动下载生成器
-        downloaded = downloader.download(
-            location, 
-            file_size, 
-            part_size_kb=512, 
-            connection_count=connection_count
-        )
-        
-        async for x in downloaded:
-            out.write(x)
-            if progress_callback:
-                r = progress_callback(out.tell(), file_size)
-                if inspect.isawaitable(r):
-                    try:
-                        await r
-                    except BaseException:
-                        pass
-                        
-    except errors.FileMigrateError as e:
-        log.info(f"DC Mismatch: File is at DC {e.new_dc}, current {dc_id}. Redirecting... (retry {retry_count + 1}/{max_retries})")
-        
-        # 【关键修复】在递归之前，必须确保旧的 downloader 已经彻底清理连接
-        if downloader:
-            await downloader._cleanup()
-        
-        # 重置文件指针
-        if callable(getattr(out, 'seek', None)):
-            out.seek(0)
-            if callable(getattr(out, 'truncate', None)):
-                out.truncate()
-        
-        # 检查重试次数
-        if retry_count >= max_retries:
-            log.error(f"Max retries ({max_retries}) reached for DC migration")
-            raise
-        
-        # 递归调用，传入新的 DC ID，增加重试计数
-        return await download_file(
-            client, 
-            location, 
-            out, 
-            file_size=file_size, 
-            progress_callback=progress_callback,
-            dc_id=e.new_dc,
-            retry_count=retry_count + 1,
-            max_retries=max_retries,
-            connection_count=connection_count
-        )
-    except (Exception, GeneratorExit) as e:
-        # 捕获其他异常或手动停止时，也要清理
-        if downloader:
-            await downloader._cleanup()
-        raise e
-    
-    return out
+DEFAULT_CONNECTION_COUNT = 16
+
+# 写入合并阈值: 攒够该字节数再调一次 write，减少每块 512KB 一次的系统调用
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+async def download_file(
+    client: TelegramClient,
+    location: TypeLocation,
+    out: BinaryIO,
+    file_size: int = None,
+    progress_callback: callable = None,
+    dc_id: int = None,
+    retry_count: int = 0,
+    max_retries: int = 3,
+    connection_count: int = DEFAULT_CONNECTION_COUNT,
+) -> BinaryIO:
+    if file_size is None:
+        if hasattr(location, 'size'):
+            file_size = location.size
+        else:
+            raise TypeError("file_size must be specified for this location type")
+
+    if dc_id is None:
+        dc_id, location = utils.get_input_location(location)
+
+    # 声明 downloader 变量，以便在 finally 块中访问
+    downloader = None
+
+    try:
+        downloader = ParallelTransferrer(client, dc_id)
+        
+        # 启动下载生成器
+        downloaded = downloader.download(
+            location, 
+            file_size, 
+            part_size_kb=512, 
+            connection_count=connection_count
+        )
+        
+        # 批量写入: 块先进缓冲区，攒够 WRITE_BUFFER_SIZE 再落盘
+        write_buffer = bytearray()
+        received = 0
+        async for x in downloaded:
+            write_buffer.extend(x)
+            received += len(x)
+            if len(write_buffer) >= WRITE_BUFFER_SIZE:
+                out.write(write_buffer)
+                write_buffer.clear()
+            if progress_callback:
+                r = progress_callback(received, file_size)
+                if inspect.isawaitable(r):
+                    try:
+                        await r
+                    except BaseException:
+                        pass
+
+        # 刷出残留数据
+        if write_buffer:
+            out.write(write_buffer)
+            write_buffer.clear()
+
+    except errors.FileMigrateError as e:
+        log.info(f"DC Mismatch: File is at DC {e.new_dc}, current {dc_id}. Redirecting... (retry {retry_count + 1}/{max_retries})")
+        
+        # 【关键修复】在递归之前，必须确保旧的 downloader 已经彻底清理连接
+        if downloader:
+            await downloader._cleanup()
+        
+        # 重置文件指针
+        if callable(getattr(out, 'seek', None)):
+            out.seek(0)
+            if callable(getattr(out, 'truncate', None)):
+                out.truncate()
+        
+        # 检查重试次数
+        if retry_count >= max_retries:
+            log.error(f"Max retries ({max_retries}) reached for DC migration")
+            raise
+        
+        # 递归调用，传入新的 DC ID，增加重试计数
+        return await download_file(
+            client, 
+            location, 
+            out, 
+            file_size=file_size, 
+            progress_callback=progress_callback,
+            dc_id=e.new_dc,
+            retry_count=retry_count + 1,
+            max_retries=max_retries,
+            connection_count=connection_count
+        )
+    except (Exception, GeneratorExit) as e:
+        # 捕获其他异常或手动停止时，也要清理
+        if downloader:
+            await downloader._cleanup()
+        raise e
+    
+    return out
 
 
 async def upload_file(
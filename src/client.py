@@ -3,19 +3,78 @@ Telegram 客户端模块
 封装 Telegram 客户端操作，包含 FastTelethon 并发下载支持
 """
 import asyncio
+import functools
 import logging
+import operator
+import re
 from pathlib import Path
 from typing import Optional, List, Union, AsyncGenerator
 from datetime import datetime
 
-from telethon import TelegramClient
-from telethon.tl.types import Message, Chat, Channel, User, PeerChannel, PeerChat, PeerUser
+from telethon import TelegramClient, utils
+from telethon.errors import FloodWaitError
+from telethon.tl.types import (
+    Message, Chat, Channel, User, PeerChannel, PeerChat, PeerUser,
+    InputPeerChannel, InputPeerChat, InputPeerUser,
+    InputMessageID, MessageEmpty,
+    MessageMediaPhoto, MessageMediaDocument, MessageMediaWebPage,
+    MessageMediaGeo, MessageMediaGeoLive, MessageMediaContact
+)
+from telethon.tl.functions.messages import GetMessagesRequest
+from telethon.tl.functions.channels import GetMessagesRequest as GetChannelMessagesRequest
 
 from .config import Config
+from .entity_cache import EntityCache
 from .models import Chat as ChatModel, Message as MessageModel, Comment as CommentModel
 
 log = logging.getLogger("TelegramClient")
 
+# 纯数字字符串 (可带负号) 的判断，避免 lstrip+isdigit 的双重扫描和字符串分配
+_NUM_RE = re.compile(r'^-?\d+$')
+
+
+@functools.lru_cache(maxsize=1024)
+def _convert_chat_id_cached(chat: Union[int, str]) -> Union[int, str]:
+    """转换超级群/频道 ID 格式 (纯函数，结果缓存)"""
+    # 最常见的整数路径放最前
+    if isinstance(chat, int):
+        return int(f"-100{chat}") if chat > 0 else chat
+    if isinstance(chat, str) and _NUM_RE.match(chat):
+        n = int(chat)
+        return int(f"-100{n}") if n > 0 else n
+    return chat
+
+# 一次性取出 message_to_model 需要的全部属性 (C 层遍历，省去逐个 hasattr 探测)
+_MSG_ATTRS = operator.attrgetter(
+    'id', 'date', 'text', 'raw_text', 'grouped_id',
+    'sender_id', 'sender', 'is_reply', 'reply_to', 'forward',
+    'views', 'forwards', 'replies'
+)
+
+# 实体类型分发表: type(entity) -> 取值函数
+# 单次哈希查找替代逐个 isinstance 的 MRO 遍历
+_CHAT_ID_FNS = {
+    Channel: lambda e: e.id,
+    Chat: lambda e: e.id,
+    User: lambda e: e.id,
+}
+_CHAT_TYPE_FNS = {
+    Channel: lambda e: "channel" if e.broadcast else "supergroup",
+    Chat: lambda e: "group",
+    User: lambda e: "private",
+}
+
+# 媒体类型映射表: type(media) -> 类型字符串
+# 比逐个 hasattr 探测快得多 (hasattr 底层走异常机制)
+_MEDIA_TYPES = {
+    MessageMediaPhoto: "photo",
+    MessageMediaDocument: "document",
+    MessageMediaWebPage: "web",
+    MessageMediaGeo: "location",
+    MessageMediaGeoLive: "location",
+    MessageMediaContact: "contact",
+}
+
 
 class TelegramDumperClient:
     """Telegram Dumper 客户端封装类"""
@@ -24,15 +83,22 @@ class TelegramDumperClient:
         self.config = config
         self.client: Optional[TelegramClient] = None
         self._connected = False
-    
+        self._owns_connection = False
+        # 实体缓存: 避免对同一聊天重复发起 get_entity 网络请求
+        self._entity_cache: dict = {}       # key -> ChatModel
+        self._raw_entity_cache: dict = {}   # key -> Telethon 实体对象
+        self._peer_cache: dict = {}         # key -> InputPeer (免去 telethon 内部解析)
+        # 磁盘实体缓存: 跨运行复用已解析的实体
+        self._disk_entity_cache = EntityCache(f"{config.session_name}_entities.db")
+
     async def connect(self):
         """连接 Telegram 服务器"""
         if self._connected:
             return
-        
+
         # 导入并应用 FastTelethon 补丁
         from . import fast_client
-        
+
         self.client = TelegramClient(
             self.config.session_name,
             self.config.api_id,
@@ -40,67 +106,96 @@ class TelegramDumperClient:
         )
         await self.client.start()
         self._connected = True
+        self._owns_connection = True
         log.info("Telegram client connected with FastTelethon patch")
-    
+
     async def disconnect(self):
         """断开连接"""
         if self.client and self._connected:
             await self.client.disconnect()
             self._connected = False
+            self._owns_connection = False
             log.info("Telegram client disconnected")
-    
+
+    async def aclose(self):
+        """显式关闭连接 (共享实例也会被关闭)"""
+        global _shared_client
+        await self.disconnect()
+        if _shared_client is self:
+            _shared_client = None
+
     async def __aenter__(self):
         """异步上下文管理器入口"""
+        # 已连接的共享实例: 不重新握手，也不负责关闭
+        self._owns_connection = not self._connected
         await self.connect()
         return self
-    
+
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """异步上下文管理器出口"""
-        await self.disconnect()
+        """异步上下文管理器出口 (仅关闭自己建立的连接)"""
+        if self._owns_connection:
+            await self.disconnect()
     
     def _get_chat_id(self, entity) -> int:
         """从实体获取聊天ID"""
-        if isinstance(entity, Channel):
-            return entity.id
-        elif isinstance(entity, Chat):
-            return entity.id
-        elif isinstance(entity, User):
-            return entity.id
-        else:
+        fn = _CHAT_ID_FNS.get(type(entity))
+        if fn is None:
             raise ValueError(f"Unknown entity type: {type(entity)}")
-    
+        return fn(entity)
+
     def _get_chat_type(self, entity) -> str:
         """从实体获取聊天类型"""
-        if isinstance(entity, Channel):
-            return "channel" if entity.broadcast else "supergroup"
-        elif isinstance(entity, Chat):
-            return "group"
-        elif isinstance(entity, User):
-            return "private"
-        return "unknown"
+        fn = _CHAT_TYPE_FNS.get(type(entity))
+        if fn is None:
+            return "unknown"
+        return fn(entity)
     
     async def get_entity(self, chat: Union[int, str]) -> ChatModel:
-        """获取聊天实体信息"""
+        """获取聊天实体信息 (带缓存，避免重复网络请求)"""
         if not self.client:
             raise RuntimeError("Client not connected")
-        
+
+        # 先查缓存 (按归一化后的 ID)
+        cache_key = self._convert_chat_id(chat)
+        if cache_key in self._entity_cache:
+            return self._entity_cache[cache_key]
+
+        # 再查磁盘缓存: 跨运行命中时直接合成 InputPeer，跳过网络解析
+        cached = await self._disk_entity_cache.get(cache_key)
+        if cached is not None:
+            model = ChatModel(
+                id=cached["id"],
+                title=cached["title"] or "",
+                type=cached["type"] or "unknown",
+                username=cached["username"]
+            )
+            input_peer = self._make_input_peer(
+                cached["type"], cached["id"], cached["access_hash"]
+            )
+            for key in (cache_key, chat, cached["id"], cached["username"]):
+                if key is not None:
+                    self._entity_cache[key] = model
+                    if input_peer is not None:
+                        self._peer_cache[key] = input_peer
+            return model
+
         # 处理超级群/频道的 ID 格式
         # 超级群和频道需要 -100 前缀
         original_chat = chat
         if isinstance(chat, str) and chat.lstrip('-').isdigit():
             # 如果是纯数字字符串，转换为整数
             chat = int(chat)
-        
+
         if isinstance(chat, int) and chat > 0:
             # 添加 -100 前缀给超级群/频道
             chat = int(f"-100{chat}")
-        
+
         try:
             entity = await self.client.get_entity(chat)
         except ValueError:
             # 如果失败，尝试原始输入
             entity = await self.client.get_entity(original_chat)
-        
+
         chat_id = self._get_chat_id(entity)
         chat_type = self._get_chat_type(entity)
         
@@ -114,12 +209,51 @@ class TelegramDumperClient:
             title = f"{entity.first_name} {entity.last_name or ''}".strip()
             username = entity.username
         
-        return ChatModel(
+        model = ChatModel(
             id=chat_id,
             title=title,
             type=chat_type,
             username=username
         )
+
+        # 写入缓存: 归一化 key、原始输入、实体 ID、用户名都可命中
+        try:
+            input_peer = utils.get_input_peer(entity)
+        except TypeError:
+            input_peer = None
+        for key in (cache_key, original_chat, chat_id, username):
+            if key is not None:
+                self._entity_cache[key] = model
+                self._raw_entity_cache[key] = entity
+                if input_peer is not None:
+                    self._peer_cache[key] = input_peer
+
+        # 持久化到磁盘缓存，下次运行免去解析 RPC
+        await self._disk_entity_cache.put(
+            cache_key,
+            chat_id,
+            getattr(entity, 'access_hash', None),
+            title,
+            chat_type,
+            username
+        )
+
+        return model
+
+    @staticmethod
+    def _make_input_peer(chat_type: str, entity_id: int, access_hash: Optional[int]):
+        """根据缓存的类型信息合成 InputPeer"""
+        if chat_type in ("channel", "supergroup"):
+            if access_hash is None:
+                return None
+            return InputPeerChannel(entity_id, access_hash)
+        if chat_type == "group":
+            return InputPeerChat(entity_id)
+        if chat_type == "private":
+            if access_hash is None:
+                return None
+            return InputPeerUser(entity_id, access_hash)
+        return None
     
     async def iter_messages(
         self,
@@ -134,8 +268,8 @@ class TelegramDumperClient:
         if not self.client:
             raise RuntimeError("Client not connected")
         
-        # 转换超级群/频道 ID
-        chat = self._convert_chat_id(chat)
+        # 解析为 InputPeer (缓存命中时跳过 telethon 内部解析)
+        chat = self._resolve_peer(chat)
         
         async for msg in self.client.iter_messages(
             chat,
@@ -147,6 +281,49 @@ class TelegramDumperClient:
         ):
             yield msg
     
+    async def stream_models(
+        self,
+        chat: Union[int, str],
+        chat_id: Optional[int] = None,
+        **kwargs
+    ) -> AsyncGenerator[MessageModel, None]:
+        """
+        流式获取消息并转换为数据模型 (生产者/消费者管道)
+        网络拉取在后台任务中进行，与模型转换重叠执行
+
+        参数:
+            chat: 聊天ID或用户名
+            chat_id: 存入模型的聊天ID (默认取实体ID)
+            kwargs: 透传给 iter_messages 的参数
+        """
+        if not self.client:
+            raise RuntimeError("Client not connected")
+
+        if chat_id is None:
+            entity = await self.get_entity(chat)
+            chat_id = entity.id
+
+        # 有界队列提供背压，避免无限缓冲
+        queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+
+        async def producer():
+            try:
+                async for msg in self.iter_messages(chat, **kwargs):
+                    await queue.put(msg)
+            finally:
+                await queue.put(None)
+
+        prod = asyncio.create_task(producer())
+        try:
+            while True:
+                msg = await queue.get()
+                if msg is None:
+                    break
+                yield self.message_to_model(msg, chat_id)
+            await prod
+        finally:
+            prod.cancel()
+
     async def get_messages(
         self,
         chat: Union[int, str],
@@ -157,8 +334,8 @@ class TelegramDumperClient:
         if not self.client:
             raise RuntimeError("Client not connected")
         
-        # 转换超级群/频道 ID
-        chat = self._convert_chat_id(chat)
+        # 解析为 InputPeer (缓存命中时跳过 telethon 内部解析)
+        chat = self._resolve_peer(chat)
         
         return await self.client.get_messages(
             chat,
@@ -166,14 +343,58 @@ class TelegramDumperClient:
             offset_id=offset_id
         )
     
-    def _convert_chat_id(self, chat: Union[int, str]) -> int:
-        """转换超级群/频道 ID 格式"""
-        if isinstance(chat, str) and chat.lstrip('-').isdigit():
-            chat = int(chat)
-        
-        if isinstance(chat, int) and chat > 0:
-            return int(f"-100{chat}")
-        return chat
+    async def get_messages_by_ids(
+        self,
+        chat: Union[int, str],
+        ids: List[int]
+    ) -> List[Message]:
+        """
+        按 ID 批量获取消息
+        每 100 个 ID 合并为一次请求，避免逐条往返
+
+        参数:
+            chat: 聊天ID或用户名
+            ids: 消息ID列表
+
+        返回:
+            消息列表 (保持输入顺序，不存在的消息被跳过)
+        """
+        if not self.client:
+            raise RuntimeError("Client not connected")
+
+        chat = self._convert_chat_id(chat)
+        # 只解析一次实体，各批次复用
+        entity = await self.client.get_input_entity(chat)
+
+        # 预分配一个请求对象，每批只改 id 字段，省去 TL 包装对象的重复构造
+        if isinstance(entity, InputPeerChannel):
+            request = GetChannelMessagesRequest(channel=entity, id=[])
+        else:
+            request = GetMessagesRequest(id=[])
+
+        results: List[Message] = []
+        for i in range(0, len(ids), 100):
+            request.id = [InputMessageID(msg_id) for msg_id in ids[i:i + 100]]
+            result = await self.client(request)
+            results.extend(
+                m for m in result.messages
+                if m is not None and not isinstance(m, MessageEmpty)
+            )
+        return results
+
+    # 同一聊天在消息迭代中被重复转换数百万次，退化为一次字典查找
+    _convert_chat_id = staticmethod(_convert_chat_id_cached)
+
+    def _resolve_peer(self, chat: Union[int, str]):
+        """
+        解析为 InputPeer (优先缓存)
+        命中缓存时直接返回具体 peer，telethon 无需再走内部实体解析
+        """
+        peer = self._peer_cache.get(chat)
+        if peer is not None:
+            return peer
+        converted = self._convert_chat_id(chat)
+        return self._peer_cache.get(converted, converted)
     
     async def download_media(
         self,
@@ -197,114 +418,149 @@ class TelegramDumperClient:
             progress_callback=progress_callback
         )
     
-    def _parse_media_type(self, message: Message) -> str:
-        """解析媒体类型"""
-        if not message.media:
-            return "text"
-        
-        media = message.media
-        
-        if hasattr(media, 'photo'):
-            return "photo"
-        elif hasattr(media, 'video'):
-            return "video"
-        elif hasattr(media, 'audio'):
-            return "audio"
-        elif hasattr(media, 'document'):
-            return "document"
-        elif hasattr(media, 'web'):
-            return "web"
-        elif hasattr(media, 'geo'):
-            return "location"
-        elif hasattr(media, 'contact'):
-            return "contact"
-        
-        return type(media).__name__.lower()
-    
-    def _extract_file_name(self, message: Message) -> Optional[str]:
-        """提取文件名 (使用 Telegram 服务器默认命名)"""
+    def _inspect_media(self, message: Message) -> tuple:
+        """
+        单次遍历媒体对象，同时解析媒体类型和文件名
+        返回: (media_type, file_name)
+        """
         if not message.media:
-            return None
-        
+            return "text", None
+
         media = message.media
-        
-        if hasattr(media, 'document') and media.document:
+        media_type = _MEDIA_TYPES.get(type(media))
+
+        if media_type == "document":
+            # 文档类: 一次扫描拿到 mime 细分类型和文件名
             doc = media.document
-            if hasattr(doc, 'attributes'):
-                for attr in doc.attributes:
+            file_name = None
+            if doc is not None:
+                for attr in getattr(doc, 'attributes', ()):
                     if hasattr(attr, 'file_name'):
-                        return attr.file_name
-        
-        return None
+                        file_name = attr.file_name
+                        break
+                mime = getattr(doc, 'mime_type', '') or ''
+                if mime.startswith('video/'):
+                    return "video", file_name
+                if mime.startswith('audio/'):
+                    return "audio", file_name
+            return "document", file_name
+
+        if media_type:
+            return media_type, None
+
+        return type(media).__name__.lower(), None
+
+    async def download_many(
+        self,
+        messages: List[Message],
+        out_dir: Union[str, Path],
+        concurrency: Optional[int] = None
+    ) -> List[Optional[str]]:
+        """
+        并发下载多条消息的媒体 (有界并发)
+
+        参数:
+            messages: 消息列表
+            out_dir: 输出目录
+            concurrency: 最大并发数 (默认取配置 download_concurrency)
+
+        返回:
+            本地文件路径列表 (与输入顺序对应，无媒体/失败为 None)
+        """
+        if not self.client:
+            raise RuntimeError("Client not connected")
+
+        sem = asyncio.Semaphore(concurrency or self.config.download_concurrency)
+        results: List[Optional[str]] = [None] * len(messages)
+
+        async def _one(index: int, msg: Message):
+            async with sem:
+                try:
+                    results[index] = await self.download_media(msg, file=str(out_dir))
+                except FloodWaitError as e:
+                    # 限流只阻塞当前任务，不拖慢整个池
+                    log.warning(f"Flood wait {e.seconds}s downloading message {msg.id}")
+                    await asyncio.sleep(e.seconds)
+                    results[index] = await self.download_media(msg, file=str(out_dir))
+
+        async with asyncio.TaskGroup() as tg:
+            for i, m in enumerate(messages):
+                tg.create_task(_one(i, m))
+
+        return results
+
+    def _parse_media_type(self, message: Message) -> str:
+        """解析媒体类型"""
+        return self._inspect_media(message)[0]
+
+    def _extract_file_name(self, message: Message) -> Optional[str]:
+        """提取文件名 (使用 Telegram 服务器默认命名)"""
+        return self._inspect_media(message)[1]
     
     def message_to_model(self, message: Message, chat_id: int) -> MessageModel:
         """将 Telethon Message 转换为数据模型"""
-        
+
+        # 一次性取出常用属性 (attrgetter 在 C 层完成遍历)
+        (msg_id, date, text, raw_text, grouped_id,
+         sender_id, sender, is_reply, reply_to, forward,
+         views, forwards, replies) = _MSG_ATTRS(message)
+
         # 提取发送者信息
-        sender_id = None
         sender_name = None
-        if hasattr(message, 'sender_id') and message.sender_id:
-            sender_id = message.sender_id
-        if hasattr(message, 'sender') and message.sender:
-            sender = message.sender
-            if hasattr(sender, 'first_name'):
-                sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
-                if hasattr(sender, 'username') and sender.username:
-                    sender_name = f"{sender_name} (@{sender.username})"
-        
+        if sender is not None and isinstance(sender, User):
+            sender_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
+            if sender.username:
+                sender_name = f"{sender_name} (@{sender.username})"
+
         # 提取回复信息
-        is_reply = hasattr(message, 'is_reply') and message.is_reply
         reply_to_msg_id = None
-        if is_reply and hasattr(message, 'reply_to') and message.reply_to:
-            reply_to_msg_id = getattr(message.reply_to, 'reply_to_msg_id', None)
-        
+        if is_reply and reply_to:
+            reply_to_msg_id = getattr(reply_to, 'reply_to_msg_id', None)
+
         # 提取转发信息
-        is_forward = hasattr(message, 'forward') and message.forward is not None
+        is_forward = forward is not None
         forward_from_chat_id = None
         forward_from_msg_id = None
         forward_from_name = None
-        if is_forward and message.forward:
-            forward_obj = message.forward
-            if hasattr(forward_obj, 'chat'):
-                forward_from_chat_id = getattr(forward_obj.chat, 'id', None)
-                forward_from_name = getattr(forward_obj.chat, 'title', None)
-            elif hasattr(forward_obj, 'from') or hasattr(forward_obj, 'from_name'):
+        if is_forward:
+            if getattr(forward, 'chat', None) is not None:
+                forward_from_chat_id = getattr(forward.chat, 'id', None)
+                forward_from_name = getattr(forward.chat, 'title', None)
+            else:
                 # 'from' 是关键字，需要用其他方式访问
-                forward_from_name = getattr(forward_obj, 'from_name', None) or getattr(forward_obj, 'from', None)
+                forward_from_name = getattr(forward, 'from_name', None) or getattr(forward, 'from', None)
                 if forward_from_name and hasattr(forward_from_name, 'name'):
                     forward_from_name = forward_from_name.name
-            if hasattr(forward_obj, 'msg_id'):
-                forward_from_msg_id = forward_obj.msg_id
-        
-        # 提取统计信息
-        views = getattr(message, 'views', None)
-        forwards = getattr(message, 'forwards', None)
-        
+            forward_from_msg_id = getattr(forward, 'msg_id', None)
+
         # 提取评论信息 (频道) - replies 属性表示评论数量
-        replies = getattr(message, 'replies', None)
-        if replies and hasattr(replies, 'replies'):
+        if replies is not None and hasattr(replies, 'replies'):
             replies = replies.replies
-        
+
         # 提取评论区信息
         is_discussion = getattr(message, 'is_discussion', False)
         discussion_chat_id = None
-        if hasattr(message, 'discussion') and message.discussion:
-            discussion_chat_id = getattr(message.discussion, 'chat', None)
-            if discussion_chat_id:
-                discussion_chat_id = getattr(discussion_chat_id, 'id', None)
-        
+        discussion = getattr(message, 'discussion', None)
+        if discussion is not None:
+            discussion_chat = getattr(discussion, 'chat', None)
+            if discussion_chat is not None:
+                discussion_chat_id = getattr(discussion_chat, 'id', None)
+
+        # 一次遍历媒体对象，同时取得类型和文件名
+        media_type, file_name = self._inspect_media(message)
+
         return MessageModel(
-            id=message.id,
+            id=msg_id,
             chat_id=chat_id,
-            date=message.date,
-            text=message.text or "",
-            raw_text=getattr(message, 'raw_text', "") or "",
-            media_type=self._parse_media_type(message),
-            file_name=self._extract_file_name(message),
-            group_id=message.grouped_id,
-            sender_id=sender_id,
+            date=date,
+            text=text or "",
+            raw_text=raw_text or "",
+            media_type=media_type,
+            file_name=file_name,
+            group_id=grouped_id,
+            sender_id=sender_id or None,
             sender_name=sender_name,
-            is_reply=is_reply,
+            is_reply=bool(is_reply),
             reply_to_msg_id=reply_to_msg_id,
             is_forward=is_forward,
             forward_from_chat_id=forward_from_chat_id,
@@ -336,17 +592,83 @@ class TelegramDumperClient:
         if not self.client:
             raise RuntimeError("Client not connected")
         
-        # 转换聊天ID格式
-        chat = self._convert_chat_id(chat)
-        
+        # 解析为 InputPeer (缓存命中时跳过 telethon 内部解析)
+        # peer 只给 telethon 用，模型里的 chat_id 必须是转换后的整数ID
+        peer = self._resolve_peer(chat)
+        chat_id = self._convert_chat_id(chat)
+
         # 使用 reply_to 参数获取评论
         async for comment in self.client.iter_messages(
-            chat,
+            peer,
             limit=limit,
             reply_to=parent_message_id
         ):
-            yield self.comment_to_model(comment, chat)
+            yield self.comment_to_model(comment, chat_id)
     
+    async def gather_comments(
+        self,
+        chat: Union[int, str],
+        parent_ids: List[int],
+        concurrency: Optional[int] = None
+    ) -> AsyncGenerator[CommentModel, None]:
+        """
+        并发获取多条父消息的评论 (有界并发)
+
+        参数:
+            chat: 聊天ID或用户名
+            parent_ids: 父消息ID列表
+            concurrency: 最大并发数 (默认取配置 comment_concurrency)
+
+        返回:
+            评论生成器 (顺序不保证)
+        """
+        if not self.client:
+            raise RuntimeError("Client not connected")
+
+        if concurrency is None:
+            concurrency = self.config.comment_concurrency
+
+        sem = asyncio.Semaphore(concurrency)
+        queue: asyncio.Queue = asyncio.Queue()
+        _DONE = object()
+
+        async def _collect_one(parent_id: int):
+            """拉取单条父消息的评论，FloodWait 时指数退避重试"""
+            async with sem:
+                delay = 1.0
+                # 重试会从头重新迭代，已入队的评论按ID去重，消费方不收重复
+                queued_ids: set = set()
+                for attempt in range(5):
+                    try:
+                        async for comment in self.iter_comments(chat, parent_id):
+                            if comment.id in queued_ids:
+                                continue
+                            queued_ids.add(comment.id)
+                            queue.put_nowait(comment)
+                        return
+                    except FloodWaitError as e:
+                        # Telegram 限流: 按服务器指示等待后重试
+                        wait = max(e.seconds, delay)
+                        log.warning(f"Flood wait {wait}s for comments of message {parent_id}")
+                        await asyncio.sleep(wait)
+                        delay *= 2
+                log.error(f"Giving up on comments of message {parent_id} after 5 flood waits")
+
+        async def _run_all():
+            tasks = [asyncio.create_task(_collect_one(pid)) for pid in parent_ids]
+            await asyncio.gather(*tasks, return_exceptions=True)
+            queue.put_nowait(_DONE)
+
+        runner = asyncio.create_task(_run_all())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            runner.cancel()
+
     def comment_to_model(self, comment: Message, chat_id: int, parent_id: int = 0) -> CommentModel:
         """将 Telethon Message 转换为评论数据模型"""
         
@@ -377,3 +699,19 @@ class TelegramDumperClient:
             sender_name=sender_name,
             views=views
         )
+
+
+# 模块级共享客户端实例 (CLI 多个子命令复用同一连接，避免重复握手)
+_shared_client: Optional[TelegramDumperClient] = None
+
+
+async def get_shared_client(config: Config) -> TelegramDumperClient:
+    """
+    获取共享客户端实例
+    已连接时直接复用，避免每个子命令重新做 MTProto 握手
+    """
+    global _shared_client
+    if _shared_client is None or not _shared_client._connected:
+        _shared_client = TelegramDumperClient(config)
+        await _shared_client.connect()
+    return _shared_client
@@ -8,24 +8,56 @@ from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Optional
 
+try:
+    # C 实现的加载器，解析速度远快于纯 Python 实现
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 
-@dataclass
+# 解析结果缓存: (路径, mtime) -> 配置字典
+# CLI 同一次运行中多个子命令重复加载时直接命中
+_config_cache: dict = {}
+
+
+@dataclass(slots=True)
 class Config:
     """Telegram Dumper 配置类"""
     api_id: int = 0                       # Telegram API ID
     api_hash: str = ""                     # Telegram API Hash
     session_name: str = "telegram_dumper" # 会话名称
     output_dir: str = "output"             # 输出目录
-    download_concurrency: int = 8          # 下载并发数
+    download_concurrency: int = 32         # 下载并发数
+    comment_concurrency: int = 16          # 评论拉取并发数
+    chat_concurrency: int = 4              # 多聊天并发数
     progress_update_interval: float = 0.5  # 进度更新间隔(秒)
-    
+    sqlite_synchronous: str = "NORMAL"     # SQLite synchronous 级别 (OFF/NORMAL/FULL)
+
+    def __post_init__(self):
+        """加载时做一次类型归一化，下游不必再做防御性转换"""
+        if isinstance(self.api_id, str):
+            self.api_id = int(self.api_id) if self.api_id.strip() else 0
+        if self.api_hash is None:
+            self.api_hash = ""
+        if self.download_concurrency < 1:
+            self.download_concurrency = 1
+        if self.comment_concurrency < 1:
+            self.comment_concurrency = 1
+        if self.chat_concurrency < 1:
+            self.chat_concurrency = 1
+        if self.sqlite_synchronous not in ("OFF", "NORMAL", "FULL"):
+            self.sqlite_synchronous = "NORMAL"
+
     @classmethod
     def load_from_file(cls, path: str = "config.yaml") -> "Config":
-        """从 YAML 文件加载配置"""
+        """从 YAML 文件加载配置 (带 mtime 缓存)"""
         config_path = Path(path)
         if config_path.exists():
-            with open(config_path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f) or {}
+            cache_key = (str(config_path), config_path.stat().st_mtime)
+            data = _config_cache.get(cache_key)
+            if data is None:
+                with open(config_path, "r", encoding="utf-8") as f:
+                    data = yaml.load(f, Loader=_YamlLoader) or {}
+                _config_cache[cache_key] = data
             return cls(**{k: v for k, v in data.items() if hasattr(cls, k)})
         return cls()
     
@@ -37,7 +69,10 @@ class Config:
             "session_name": self.session_name,
             "output_dir": self.output_dir,
             "download_concurrency": self.download_concurrency,
+            "comment_concurrency": self.comment_concurrency,
+            "chat_concurrency": self.chat_concurrency,
             "progress_update_interval": self.progress_update_interval,
+            "sqlite_synchronous": self.sqlite_synchronous,
         }
         with open(path, "w", encoding="utf-8") as f:
             yaml.dump(data, f, allow_unicode=True)
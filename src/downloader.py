@@ -3,22 +3,40 @@
 实现消息和媒体的下载逻辑，包含增量下载支持
 """
 import asyncio
+import functools
 import logging
 import os
+from itertools import groupby
 from pathlib import Path
 from typing import Optional, List, Callable, Set, Union
 from datetime import datetime
 
-from telethon.tl.types import Message
+from telethon.tl.types import (
+    Message,
+    MessageMediaWebPage, MessageMediaPoll, MessageMediaContact,
+    MessageMediaGeo, MessageMediaGeoLive, MessageMediaVenue, MessageMediaDice
+)
 
 from .client import TelegramDumperClient
 from .config import Config
 from .models import Message as MessageModel, Chat as ChatModel, DownloadRecord, Comment as CommentModel
 from .storage.json_storage import JSONStorage
 from .storage.sqlite_storage import SQLiteStorage
+from .storage.unified_storage import UnifiedStorage
 
 log = logging.getLogger("Downloader")
 
+__all__ = ["Downloader", "ProgressTracker"]
+
+# 无实际文件可下的媒体类型 (网页预览/投票/位置等)，download_media 只会白跑一趟
+_NON_DOWNLOADABLE_MEDIA = (
+    MessageMediaWebPage, MessageMediaPoll, MessageMediaContact,
+    MessageMediaGeo, MessageMediaGeoLive, MessageMediaVenue, MessageMediaDice
+)
+
+# 评论缓冲上限: 攒够这个数就整块入队，限制热门帖子的内存占用
+_COMMENT_BUFFER_LIMIT = 500
+
 
 class ProgressTracker:
     """进度跟踪器"""
@@ -49,31 +67,98 @@ class ProgressTracker:
                 f"Errors: {self.errors}")
 
 
+def _report_progress(progress: "ProgressTracker", current: int, total: int):
+    """模块级进度回调 (配合 partial 使用，免去每次下载新建闭包)"""
+    if total > 0:
+        percent = current / total * 100
+        log.debug(f"Downloading: {percent:.1f}%")
+
+
+class _FdSink:
+    """
+    最小文件写入包装
+    直接 os.write 到预打开的 fd，telethon 收到的块不再经过中间文件对象缓冲
+    """
+    __slots__ = ("_fd",)
+
+    def __init__(self, fd: int):
+        self._fd = fd
+
+    def write(self, data) -> int:
+        return os.write(self._fd, data)
+
+    def seek(self, pos: int, whence: int = 0) -> int:
+        return os.lseek(self._fd, pos, whence)
+
+    def tell(self) -> int:
+        return os.lseek(self._fd, 0, os.SEEK_CUR)
+
+    def truncate(self) -> int:
+        return os.ftruncate(self._fd, self.tell())
+
+    def flush(self):
+        pass
+
+    def close(self):
+        os.close(self._fd)
+
+
 class Downloader:
     """下载器主类"""
     
     def __init__(self, config: Config, output_dir: str = "output"):
         self.config = config
         self.output_dir = Path(output_dir)
-        self.json_storage = JSONStorage(str(self.output_dir))
-        self.sqlite_storage = SQLiteStorage(str(self.output_dir))
+        self.storage = UnifiedStorage(
+            str(self.output_dir),
+            sqlite_synchronous=config.sqlite_synchronous
+        )
+        # 保留后端引用，外部调用方仍可直接访问
+        self.json_storage = self.storage.json_storage
+        self.sqlite_storage = self.storage.sqlite_storage
+        # 媒体组目录的文件名缓存: 同组后续成员不用重新列目录
+        # 只收录 group_* 目录——单消息媒体目录不会二次命中，缓存了只涨内存
+        self._dir_cache: dict = {}  # Path -> set[str]
+        # 本批下载记录状态的预取缓存: 每批一条 IN 查询替代逐文件查询
+        self._record_statuses: dict = {}  # chat_id -> {(message_id, file_name): status}
+        # 已创建目录集合: 跳过几乎总是 EEXIST 的重复 mkdir 系统调用
+        self._mkdir_cache: set = set()  # set[Path]
+        # 每个聊天的消息根目录字符串: 热路径用 os.path.join 拼一次，
+        # 避免 Path.__truediv__ 的多层对象分配
+        self._output_dir_str = str(self.output_dir)
+        self._chat_roots: dict = {}  # chat_id -> str
+
+    def _msgs_root(self, chat_id: int) -> str:
+        """获取聊天消息根目录的字符串路径 (缓存)"""
+        root = self._chat_roots.get(chat_id)
+        if root is None:
+            root = os.path.join(self._output_dir_str, str(chat_id), "messages")
+            self._chat_roots[chat_id] = root
+        return root
+
+    def _ensure_dir(self, path: Path, cache: bool = True):
+        """
+        创建目录 (带缓存，已见过的路径直接跳过)
+        一次性目录 (单消息媒体目录等) 传 cache=False，
+        不进缓存，条目数不随消息总量无限增长
+        """
+        if path in self._mkdir_cache:
+            return
+        path.mkdir(parents=True, exist_ok=True)
+        if cache:
+            self._mkdir_cache.add(path)
     
     def _get_message_dir(self, chat_id: int, message_id: int) -> Path:
         """获取消息目录路径"""
-        return self.output_dir / str(chat_id) / "messages" / str(message_id)
-    
+        return Path(os.path.join(self._msgs_root(chat_id), str(message_id)))
+
     def _get_media_dir(self, chat_id: int, message_id: int, group_id: Optional[int] = None) -> Path:
         """获取媒体目录路径"""
+        root = self._msgs_root(chat_id)
         if group_id:
             # 媒体组使用 group 文件夹
-            return self.output_dir / str(chat_id) / "messages" / f"group_{group_id}"
-        return self.output_dir / str(chat_id) / "messages" / str(message_id) / "media"
-    
-    async def _check_message_exists(self, chat_id: int, message_id: int) -> bool:
-        """检查消息是否已存在 (目录 + 数据库双重检查)"""
-        dir_exists = self._get_message_dir(chat_id, message_id).exists()
-        db_exists = await self.sqlite_storage.message_exists(message_id, chat_id)
-        return dir_exists and db_exists
+            return Path(os.path.join(root, f"group_{group_id}"))
+        return Path(os.path.join(root, str(message_id), "media"))
     
     async def _download_media(
         self,
@@ -89,85 +174,121 @@ class Downloader:
         """
         if not message.media:
             return None
-        
+
+        # 网页预览等类型没有可落盘的文件，提前返回
+        if isinstance(message.media, _NON_DOWNLOADABLE_MEDIA):
+            return None
+
         group_id = message.grouped_id
         media_dir = self._get_media_dir(chat_id, message.id, group_id)
-        media_dir.mkdir(parents=True, exist_ok=True)
-        
+        # 只有媒体组目录会被同组成员重复触达，其余目录不值得缓存
+        self._ensure_dir(media_dir, cache=group_id is not None)
+
+        # 纯函数结果只算一次，下面的三处 DownloadRecord 构造直接复用
         file_name = client._extract_file_name(message)
+        media_type = client._parse_media_type(message)
         
         # 检查文件是否已存在且下载完成 (防止重复下载)
         # 需要检查 download_records 中的状态
         if file_name:
-            existing_files = list(media_dir.glob("*"))
-            existing_names = [f.name for f in existing_files]
-            
+            if group_id is not None:
+                existing_names = self._dir_cache.get(media_dir)
+                if existing_names is None:
+                    # scandir 迭代器直接建集合，不经过中间列表
+                    with os.scandir(media_dir) as entries:
+                        existing_names = {e.name for e in entries}
+                    self._dir_cache[media_dir] = existing_names
+            else:
+                # 单消息媒体目录只列一次，不进缓存
+                with os.scandir(media_dir) as entries:
+                    existing_names = {e.name for e in entries}
+
             if file_name in existing_names:
-                # 检查下载记录状态
-                record_status = await self.sqlite_storage.get_download_record_status(
-                    message.id, chat_id, file_name
-                )
+                # 检查下载记录状态 (优先命中本批的预取缓存)
+                batch_records = self._record_statuses.get(chat_id)
+                if batch_records is not None:
+                    record_status = batch_records.get((message.id, file_name))
+                else:
+                    record_status = await self.sqlite_storage.get_download_record_status(
+                        message.id, chat_id, file_name
+                    )
                 if record_status == "completed":
                     log.debug(f"File already downloaded: {file_name}")
                     if progress:
                         progress.update(downloaded=0, skipped=1)
                     return str(media_dir / file_name)
                 # 如果状态是 pending 或 failed，需要重新下载
-        
-        # 开始下载前，先保存记录状态为 pending
-        if file_name:
-            pending_record = DownloadRecord(
-                message_id=message.id,
-                chat_id=chat_id,
-                file_name=file_name,
-                file_path=str(media_dir / file_name) if file_name else "",
-                media_type=client._parse_media_type(message),
-                status="pending"
-            )
-            await self.sqlite_storage.save_download_record(pending_record)
-        
-        def progress_callback(current: int, total: int):
-            """进度回调函数"""
-            if progress and total > 0:
-                percent = current / total * 100
-                log.debug(f"Downloading: {percent:.1f}%")
-        
+
+        # 只落终态记录: 没有 completed 记录本身就表示"未完成"，
+        # 下载前的 pending 写入纯属多余的一次 fsync
+
+        # progress 为 None (常见情况) 时直接传 None，telethon 可完全跳过逐块回调
+        progress_callback = None
+        if progress is not None:
+            progress_callback = functools.partial(_report_progress, progress)
+
         try:
-            file_path = await client.download_media(
-                message,
-                file=str(media_dir),
-                progress_callback=progress_callback
-            )
-            
+            if file_name:
+                # 已知文件名: 预打开 fd 直写，避免 telethon 内部的文件对象开销
+                target_path = media_dir / file_name
+                fd = os.open(str(target_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+                sink = _FdSink(fd)
+                try:
+                    result = await client.download_media(
+                        message,
+                        file=sink,
+                        progress_callback=progress_callback
+                    )
+                finally:
+                    sink.close()
+                file_path = str(target_path) if result is not None else None
+            else:
+                # 文件名未知 (照片等): 仍交给 telethon 命名
+                file_path = await client.download_media(
+                    message,
+                    file=str(media_dir),
+                    progress_callback=progress_callback
+                )
+
             if file_path:
-                # 下载成功，更新记录状态为 completed
+                # 下载成功，终态记录进批量写队列
                 record = DownloadRecord(
                     message_id=message.id,
                     chat_id=chat_id,
                     file_name=os.path.basename(file_path),
                     file_path=file_path,
-                    media_type=client._parse_media_type(message),
+                    media_type=media_type,
                     status="completed"
                 )
-                await self.sqlite_storage.save_download_record(record)
-                
+                self.storage.queue_record(record)
+
+                # 同步本批的记录状态缓存
+                batch_records = self._record_statuses.get(chat_id)
+                if batch_records is not None:
+                    batch_records[(message.id, record.file_name)] = "completed"
+
+                # 更新目录缓存，媒体组的后续成员不用重新列目录
+                cached = self._dir_cache.get(media_dir)
+                if cached is not None:
+                    cached.add(os.path.basename(file_path))
+
                 if progress:
                     progress.update(downloaded=1, skipped=0)
-                
+
                 return file_path
         except Exception as e:
             log.error(f"Failed to download media for message {message.id}: {e}")
-            # 下载失败，更新记录状态为 failed
+            # 下载失败，failed 终态记录同样走批量写队列
             if file_name:
                 failed_record = DownloadRecord(
                     message_id=message.id,
                     chat_id=chat_id,
                     file_name=file_name,
                     file_path=str(media_dir / file_name) if file_name else "",
-                    media_type=client._parse_media_type(message),
+                    media_type=media_type,
                     status="failed"
                 )
-                await self.sqlite_storage.save_download_record(failed_record)
+                self.storage.queue_record(failed_record)
             if progress:
                 progress.update(downloaded=0, skipped=0, error=1)
         
@@ -179,21 +300,23 @@ class Downloader:
         chat_id: int,
         parent_message_id: int,
         api_chat_id: int
-    ) -> List[CommentModel]:
+    ) -> int:
         """
-        获取并保存评论
-        
+        获取评论并送入批量写队列
+        边拉边攒，缓冲到阈值就整块入队，热门帖子不会把全部评论压在内存里
+
         参数:
             client: Telegram 客户端
             chat_id: 存储用的聊天ID (原始ID)
             parent_message_id: 父消息ID
             api_chat_id: API用的聊天ID (带-100前缀)
-            
+
         返回:
-            评论列表
+            评论数量
         """
         comments = []
-        
+        count = 0
+
         try:
             # 使用 api_chat_id 进行 API 调用
             async for comment in client.iter_comments(api_chat_id, parent_message_id):
@@ -201,15 +324,18 @@ class Downloader:
                 comment.chat_id = chat_id
                 comment.parent_id = parent_message_id
                 comments.append(comment)
-                
-                # 保存到存储
-                await self.json_storage.save_comment(comment)
-                await self.sqlite_storage.save_comment(comment)
-                
+                if len(comments) >= _COMMENT_BUFFER_LIMIT:
+                    self.storage.queue_comments(comments)
+                    count += len(comments)
+                    comments = []
+
         except Exception as e:
             log.debug(f"Failed to get comments for message {parent_message_id}: {e}")
-        
-        return comments
+
+        if comments:
+            self.storage.queue_comments(comments)
+            count += len(comments)
+        return count
     
     async def download_chat(
         self,
@@ -252,7 +378,6 @@ class Downloader:
         log.info(f"Starting download for chat: {entity.title} (ID: {chat_id})")
         
         # 创建用于存储的 Chat 对象，使用正确的存储ID
-        from .models import Chat as ChatModel
         storage_entity = ChatModel(
             id=chat_id,
             title=entity.title,
@@ -263,17 +388,13 @@ class Downloader:
         # 保存元数据
         await self.json_storage.save_chat_metadata(storage_entity)
         await self.sqlite_storage.save_chat(storage_entity)
+
+        # 预创建消息根目录，后续 _ensure_dir 的常见情况是纯内存命中
+        self._ensure_dir(self.output_dir / str(chat_id) / "messages")
         
-        # 获取已存在的消息ID集合（使用 set 提高查找效率）
-        existing_ids = await self.sqlite_storage.get_all_message_ids(chat_id)
-        log.info(f"Found {len(existing_ids)} existing messages in database")
-        
-        # 批量预加载所有消息的下载状态（避免每条消息都查询数据库）
+        # 已有消息的下载状态按批查询，不再一次性加载整张表进内存
         message_statuses = {}
-        if existing_ids:
-            message_statuses = await self.sqlite_storage.get_all_message_statuses(chat_id)
-            log.info(f"Loaded download statuses for {len(message_statuses)} messages")
-        
+
         messages_downloaded = 0
         media_downloaded = 0
         messages_skipped = 0
@@ -282,97 +403,119 @@ class Downloader:
         offset_id = 0
         batch_size = 100
         total_processed = 0
-        group_messages_buffer = []  # 用于收集同一 group 的消息
-        
-        def _is_group_message(msg) -> bool:
-            """判断消息是否为 group 消息的一部分"""
-            return hasattr(msg, 'grouped_id') and msg.grouped_id is not None
-        
-        def _is_message_complete(msg_id: int) -> bool:
-            """
-            使用预加载的状态检查消息是否完全下载完成
-            """
-            if msg_id not in existing_ids:
-                return False
-            status = message_statuses.get(msg_id)
-            # download_status 为 'completed' 或 None（旧数据）都视为已完成
-            return status == "completed" or status is None
-        
+
+        _MISSING = object()
+
+
+        # 每消息都要用的方法绑定为局部名，闭包内省去逐次属性链查找
+        message_to_model = client.message_to_model
+        queue_message = self.storage.queue_message
+
+        # 有界并发: 同一批内的消息下载齐头并进，受信号量限制
+        download_sem = asyncio.Semaphore(self.config.download_concurrency)
+
+        async def _download_with_sem(msg):
+            """信号量限流下的单消息下载"""
+            async with download_sem:
+                await _download_single_message(msg)
+
         async def _process_message_group(messages_batch) -> int:
             """
             处理一组消息（包含可能的 group 消息）
+            先同步扫描决定跳过/下载，再并发执行本批所有下载
             返回本次处理的消息数量
             """
-            nonlocal messages_downloaded, media_downloaded, messages_skipped, total_processed, offset_id
-            
+            nonlocal messages_downloaded, media_downloaded, messages_skipped, total_processed, offset_id, errors
+
             if not messages_batch:
                 return 0
-            
+
             processed_count = 0
-            idx = 0
-            
-            while idx < len(messages_batch):
-                msg = messages_batch[idx]
-                
-                # 检查是否是 group 消息
-                is_group = _is_group_message(msg)
-                
-                if is_group:
-                    # group 消息：需要处理整个 group
-                    group_id = msg.grouped_id
-                    group_msgs = []
-                    
-                    # 收集同一 group 的所有消息
-                    while idx < len(messages_batch) and _is_group_message(messages_batch[idx]) and messages_batch[idx].grouped_id == group_id:
-                        group_msgs.append(messages_batch[idx])
-                        idx += 1
-                    
+            to_download = []  # 本批待下载消息 (扁平列表)
+            limit_hit = False
+
+            # 方法查找提出循环: 每消息只剩一次字典取值
+            # (download_status 为 'completed' 或 None 旧数据都视为已完成)
+            statuses_get = message_statuses.get
+
+            # 单遍扫描: 相邻的同 grouped_id 消息天然成组，groupby 一趟切完
+            for group_id, group_iter in groupby(messages_batch, key=lambda m: m.grouped_id):
+                if group_id is not None:
+                    # group 消息：整组作为一个整体处理
+                    group_msgs = list(group_iter)
+                    msg = group_msgs[0]
+
                     # 使用预加载的状态检查 group 是否已完全下载
-                    group_all_complete = True
+                    group_complete = True
                     for gm in group_msgs:
-                        if not _is_message_complete(gm.id):
-                            group_all_complete = False
+                        status = statuses_get(gm.id, _MISSING)
+                        if status is _MISSING or (status is not None and status != "completed"):
+                            group_complete = False
                             break
-                    
-                    if group_all_complete:
+
+                    if group_complete:
                         # 整个 group 已完全下载，跳过
                         messages_skipped += 1
                         log.debug(f"Skipping group {group_id} (already downloaded)")
                     else:
                         # 需要下载这个 group
-                        for gm in group_msgs:
-                            await _download_single_message(gm)
+                        to_download.extend(group_msgs)
                         messages_downloaded += 1
-                    
+
                     processed_count += len(group_msgs)
+
+                    # 更新进度 (limit 按整体消息计数)
+                    if limit and messages_downloaded + messages_skipped >= limit:
+                        break
+
+                    total_processed += 1
+                    if progress_callback:
+                        # 参数: (total_processed, msg_id, is_group, media_type, is_downloading)
+                        media_type = msg.media_type if hasattr(msg, 'media_type') else ('media' if msg.media else 'text')
+                        progress_callback(total_processed, msg.id, True, media_type, msg.media is not None)
+
+                    offset_id = msg.id
                 else:
-                    # 普通消息：使用预加载的状态检查
-                    if _is_message_complete(msg.id):
-                        messages_skipped += 1
-                        log.debug(f"Skipping message {msg.id} (already downloaded)")
-                    else:
-                        await _download_single_message(msg)
-                        messages_downloaded += 1
-                    
-                    processed_count += 1
-                    idx += 1
-                
-                # 更新进度
-                if limit:
-                    # limit 是按整体消息计数
-                    if messages_downloaded + messages_skipped >= limit:
+                    # 普通消息：逐条使用预加载的状态检查
+                    for msg in group_iter:
+                        status = statuses_get(msg.id, _MISSING)
+                        if status is not _MISSING and (status is None or status == "completed"):
+                            messages_skipped += 1
+                            log.debug(f"Skipping message {msg.id} (already downloaded)")
+                        else:
+                            to_download.append(msg)
+                            messages_downloaded += 1
+
+                        processed_count += 1
+
+                        if limit and messages_downloaded + messages_skipped >= limit:
+                            limit_hit = True
+                            break
+
+                        total_processed += 1
+                        if progress_callback:
+                            media_type = msg.media_type if hasattr(msg, 'media_type') else ('media' if msg.media else 'text')
+                            progress_callback(total_processed, msg.id, False, media_type, msg.media is not None)
+
+                        offset_id = msg.id
+
+                    if limit_hit:
                         break
-                
-                total_processed += 1
-                if progress_callback:
-                    # 传递更详细的进度信息
-                    # 参数: (total_processed, msg_id, is_group, media_type, is_downloading)
-                    is_group = _is_group_message(msg)
-                    media_type = msg.media_type if hasattr(msg, 'media_type') else ('media' if msg.media else 'text')
-                    progress_callback(total_processed, msg.id, is_group, media_type, msg.media is not None)
-                
-                offset_id = msg.id
-            
+
+            # 并发执行本批下载 (下一批抓取前收尾，offset_id 语义不变)
+            if to_download:
+                results = await asyncio.gather(
+                    *(_download_with_sem(m) for m in to_download),
+                    return_exceptions=True
+                )
+                for m, r in zip(to_download, results):
+                    if isinstance(r, Exception):
+                        log.error(f"Failed to download message {m.id}: {r}")
+                        errors += 1
+
+            # 批量刷盘: 两个后端各自按批写入
+            await self.storage.flush()
+
             return processed_count
         
         async def _download_single_message(msg):
@@ -380,71 +523,121 @@ class Downloader:
             nonlocal media_downloaded, errors
             
             # 转换为数据模型
-            msg_model = client.message_to_model(msg, chat_id)
+            msg_model = message_to_model(msg, chat_id)
             
             # 设置下载状态为 pending
             msg_model.download_status = "pending"
             
-            # 下载媒体
-            file_path = None
+            # 媒体下载与评论拉取是相互独立的网络往返，并行发出
+            media_task = None
             if msg.media and not skip_media:
+                media_task = asyncio.create_task(
+                    self._download_media(client, msg, chat_id, None)
+                )
+
+            # 获取评论: 只有带评论区且确有回复的消息才发请求
+            # (私聊/普通群/未开评论区的频道帖都直接跳过，省一次往返)
+            replies_obj = getattr(msg, 'replies', None)
+            has_comments = bool(
+                replies_obj
+                and getattr(replies_obj, 'comments', False)
+                and getattr(replies_obj, 'replies', 0)
+            )
+            comments_task = None
+            if has_comments:
+                api_chat_id = entity_chat_id if entity_chat_id != chat_id else original_chat_input
+                comments_task = asyncio.create_task(
+                    self._download_comments(client, chat_id, msg.id, api_chat_id)
+                )
+
+            if media_task is not None:
                 try:
-                    file_path = await self._download_media(client, msg, chat_id, None)
+                    file_path = await media_task
                     msg_model.file_path = file_path
                     if file_path:
                         media_downloaded += 1
                 except Exception as e:
                     log.error(f"Error downloading media for message {msg.id}: {e}")
                     errors += 1
-            
+
             # 下载完成后，设置状态为 completed
             msg_model.download_status = "completed"
-            
-            # 保存到存储
-            await self.json_storage.save_message(msg_model)
-            await self.sqlite_storage.save_message(msg_model)
-            
-            # 获取评论 (如果有评论区)
-            api_chat_id = entity_chat_id if entity_chat_id != chat_id else original_chat_input
-            comments_downloaded = await self._download_comments(client, chat_id, msg.id, api_chat_id)
-            comments_count = len(comments_downloaded) if comments_downloaded else 0
-            if comments_count > 0:
-                log.debug(f"Downloaded {comments_count} comments for message {msg.id}")
+
+            # 进入待写队列，由批量刷盘统一持久化
+            queue_message(msg_model)
+
+            if comments_task is not None:
+                n_comments = await comments_task
+                if n_comments:
+                    log.debug(f"Downloaded {n_comments} comments for message {msg.id}")
         
-        # 分批获取消息
-        while True:
-            # 计算本次请求的数量
-            current_batch_size = batch_size
+        def _next_batch_size() -> int:
+            """计算下次请求的数量"""
             if limit:
                 # 如果还需要更多整体消息，获取更多
                 remaining_whole = limit - (messages_downloaded + messages_skipped)
                 if remaining_whole > 0:
                     # 每个整体消息可能包含多条消息，多获取一些
-                    current_batch_size = min(batch_size, remaining_whole * 10)
-            
-            # 使用 entity_chat_id (带 -100 前缀) 进行 API 调用
-            api_chat_id = entity_chat_id if entity_chat_id != chat_id else original_chat_input
-            messages = await client.get_messages(api_chat_id, limit=current_batch_size, offset_id=offset_id)
-            
-            if not messages:
-                break
-            
-            # 处理这批消息
-            processed = await _process_message_group(messages)
-            
-            # 检查是否达到限制 (按整体消息计数)
-            if limit and (messages_downloaded + messages_skipped) >= limit:
-                break
-            
-            # 检查是否已获取全部消息
-            if len(messages) < current_batch_size:
-                break
-        
-        # 更新聊天元数据
-        entity.last_message_id = offset_id
-        entity.total_messages = messages_downloaded
-        await self.json_storage.save_chat_metadata(entity)
-        await self.sqlite_storage.save_chat(entity)
+                    return min(batch_size, remaining_whole * 10)
+            return batch_size
+
+        # 使用 entity_chat_id (带 -100 前缀) 进行 API 调用
+        api_chat_id = entity_chat_id if entity_chat_id != chat_id else original_chat_input
+
+        # 双缓冲预取: 处理本批的同时，下一批已经在路上
+        current_batch_size = _next_batch_size()
+        next_task = asyncio.create_task(
+            client.get_messages(api_chat_id, limit=current_batch_size, offset_id=offset_id)
+        )
+        try:
+            while True:
+                messages = await next_task
+                next_task = None
+
+                if not messages:
+                    break
+
+                # 下一页的 offset 就是本批最后一条的ID，处理前即可发起预取
+                requested = current_batch_size
+                if len(messages) >= requested:
+                    current_batch_size = _next_batch_size()
+                    next_task = asyncio.create_task(
+                        client.get_messages(
+                            api_chat_id,
+                            limit=current_batch_size,
+                            offset_id=messages[-1].id
+                        )
+                    )
+
+                # 只探测本批ID的存在性/状态 (IN 查询)
+                batch_ids = [m.id for m in messages]
+                message_statuses = await self.sqlite_storage.get_statuses_for(
+                    chat_id, batch_ids
+                )
+                # 下载记录状态同样按批预取，_download_media 不再逐文件查库
+                self._record_statuses[chat_id] = await self.sqlite_storage.get_record_statuses_for(
+                    chat_id, batch_ids
+                )
+
+                # 处理这批消息
+                processed = await _process_message_group(messages)
+
+                # 检查是否达到限制 (按整体消息计数)
+                if limit and (messages_downloaded + messages_skipped) >= limit:
+                    break
+
+                # 检查是否已获取全部消息
+                if next_task is None:
+                    break
+        finally:
+            # 提前退出时取消在途的预取请求
+            if next_task is not None:
+                next_task.cancel()
+            self._record_statuses.pop(chat_id, None)
+        
+        # 只更新计数字段，元数据本体在开头已写过一次
+        await self.json_storage.update_chat_counters(chat_id, offset_id, messages_downloaded)
+        await self.sqlite_storage.update_chat_counters(chat_id, offset_id, messages_downloaded)
         
         result = {
             "chat_id": chat_id,
@@ -464,22 +657,23 @@ class Downloader:
         chats: List[Union[int, str]],
         progress_callback: Optional[Callable] = None
     ) -> List[dict]:
-        """批量下载多个聊天"""
-        results = []
-        
-        for chat in chats:
-            try:
-                result = await self.download_chat(
-                    client,
-                    chat,
-                    progress_callback=progress_callback
-                )
-                results.append(result)
-            except Exception as e:
-                log.error(f"Failed to download chat {chat}: {e}")
-                results.append({
-                    "chat": str(chat),
-                    "error": str(e)
-                })
-        
-        return results
+        """批量下载多个聊天 (有界并发)"""
+        sem = asyncio.Semaphore(self.config.chat_concurrency)
+
+        async def _safe_download_chat(chat) -> dict:
+            """单聊天下载 (信号量限流 + 异常转结果)"""
+            async with sem:
+                try:
+                    return await self.download_chat(
+                        client,
+                        chat,
+                        progress_callback=progress_callback
+                    )
+                except Exception as e:
+                    log.error(f"Failed to download chat {chat}: {e}")
+                    return {
+                        "chat": str(chat),
+                        "error": str(e)
+                    }
+
+        return list(await asyncio.gather(*(_safe_download_chat(c) for c in chats)))
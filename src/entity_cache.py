@@ -0,0 +1,95 @@
+"""
+实体缓存模块
+将已解析的聊天实体持久化到 SQLite，跨运行复用，省去重复的 get_entity 网络请求
+"""
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Union
+
+import aiosqlite
+
+# 缓存有效期 (秒)，过期条目重新解析
+DEFAULT_TTL = 24 * 3600
+
+
+class EntityCache:
+    """已解析实体的 SQLite 持久化缓存"""
+
+    def __init__(self, path: str = "entity_cache.db", ttl: int = DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+
+    async def _get_connection(self):
+        """获取数据库连接"""
+        if self.path.parent != Path('.'):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = await aiosqlite.connect(str(self.path))
+        conn.row_factory = aiosqlite.Row
+        return conn
+
+    async def init_db(self):
+        """初始化缓存表结构"""
+        conn = await self._get_connection()
+        try:
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    key TEXT PRIMARY KEY,
+                    id INTEGER NOT NULL,
+                    access_hash INTEGER,
+                    title TEXT,
+                    type TEXT,
+                    username TEXT,
+                    resolved_at INTEGER NOT NULL
+                )
+            """)
+            await conn.commit()
+        finally:
+            await conn.close()
+
+    async def get(self, key: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """查询缓存条目 (过期返回 None)"""
+        await self.init_db()
+        conn = await self._get_connection()
+        try:
+            async with conn.execute(
+                "SELECT * FROM entities WHERE key = ?", (str(key),)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row is None:
+                    return None
+                if time.time() - row["resolved_at"] > self.ttl:
+                    # 过期条目: 触发重新解析
+                    return None
+                return dict(row)
+        finally:
+            await conn.close()
+
+    async def put(
+        self,
+        key: Union[int, str],
+        entity_id: int,
+        access_hash: Optional[int],
+        title: str,
+        chat_type: str,
+        username: Optional[str]
+    ):
+        """写入/刷新缓存条目"""
+        await self.init_db()
+        conn = await self._get_connection()
+        try:
+            await conn.execute("""
+                INSERT OR REPLACE INTO entities
+                (key, id, access_hash, title, type, username, resolved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                str(key),
+                entity_id,
+                access_hash,
+                title,
+                chat_type,
+                username,
+                int(time.time())
+            ))
+            await conn.commit()
+        finally:
+            await conn.close()
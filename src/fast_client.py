@@ -2,7 +2,9 @@
 FastTelethon 补丁模块
 通过 Monkey Patch 方式为 Telethon 添加并发下载支持
 """
+import asyncio
 import io
+import os
 import pathlib
 import logging
 from telethon import TelegramClient, helpers
@@ -20,6 +22,22 @@ def set_connection_count(count: int):
     global _default_connection_count
     _default_connection_count = max(2, min(count, 20))
 
+def _open_preallocated(path: str, file_size):
+    """打开目标文件并预分配磁盘空间 (阻塞操作，须在线程里执行)
+
+    已知大小时预分配，后续并发块写入不再反复扩展文件；
+    文件系统不支持原生 fallocate 时 glibc 会退化成写零填充，
+    大文件可能耗时数秒，因此整个函数不能在事件循环线程上跑
+    """
+    f = open(path, 'wb')
+    if file_size and hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(f.fileno(), 0, file_size)
+        except OSError:
+            pass
+    return f
+
+
 # 保存原始的 _download_file 方法
 original_download_file = TelegramClient._download_file
 
@@ -64,7 +82,7 @@ async def fast_download_file(
         f = io.BytesIO()
     elif isinstance(file, str):
         helpers.ensure_parent_dir_exists(file)
-        f = open(file, 'wb')
+        f = await asyncio.to_thread(_open_preallocated, file, file_size)
     else:
         f = file
 
@@ -2,16 +2,43 @@
 数据模型模块
 定义消息、聊天和下载记录的数据类
 """
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields
 from datetime import datetime, timezone, timedelta
 from typing import Optional, Any, Dict, List
 import json
 
+try:
+    # orjson 为 C 实现，编码速度比 stdlib json 快数倍
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # C 实现的 ISO8601 解析器，比 datetime.fromisoformat 快一个数量级
+    from ciso8601 import parse_datetime
+except ImportError:
+    parse_datetime = datetime.fromisoformat
+
 
 # 东八区时区
 UTC_PLUS_8 = timezone(timedelta(hours=8))
 
 
+def dumps_json(obj: Any, indent: bool = False) -> str:
+    """序列化为 JSON 字符串 (优先 orjson，回退 stdlib json)"""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+
+def loads_json(data: str) -> Any:
+    """反序列化 JSON 字符串 (优先 orjson，回退 stdlib json)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def to_local_time(dt: datetime) -> datetime:
     """将 UTC 时间转换为东八区时间"""
     if dt is None:
@@ -23,7 +50,7 @@ def to_local_time(dt: datetime) -> datetime:
     return dt.astimezone(UTC_PLUS_8)
 
 
-@dataclass
+@dataclass(slots=True)
 class Message:
     """消息数据模型"""
     id: int                                 # 消息ID
@@ -64,24 +91,29 @@ class Message:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = {name: getattr(self, name) for name in _MESSAGE_FIELDS}
         # 将 UTC 时间转换为东八区时间
-        if self.date:
-            local_date = to_local_time(self.date)
-            data["date"] = local_date.isoformat()
-        else:
-            data["date"] = None
+        data["date"] = to_local_time(self.date).isoformat() if self.date else None
         return data
-    
+
+    def to_dict_compact(self) -> Dict[str, Any]:
+        """转换为紧凑字典 (省略 None 和空串字段，JSONL 落盘用)
+
+        文本消息大多数可选字段为空，省略后每行体积减半；
+        from_dict 靠 dataclass 默认值补回缺失字段
+        """
+        return {k: v for k, v in self.to_dict().items()
+                if v is not None and v != ""}
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Message":
         """从字典创建对象"""
         if isinstance(data.get("date"), str):
-            data["date"] = datetime.fromisoformat(data["date"])
+            data["date"] = parse_datetime(data["date"])
         return cls(**data)
 
 
-@dataclass
+@dataclass(slots=True)
 class Chat:
     """聊天数据模型"""
     id: int                                 # 聊天ID
@@ -94,24 +126,20 @@ class Chat:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = {name: getattr(self, name) for name in _CHAT_FIELDS}
         # 将 UTC 时间转换为东八区时间
-        if self.created_at:
-            local_created_at = to_local_time(self.created_at)
-            data["created_at"] = local_created_at.isoformat()
-        else:
-            data["created_at"] = None
+        data["created_at"] = to_local_time(self.created_at).isoformat() if self.created_at else None
         return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Chat":
         """从字典创建对象"""
         if isinstance(data.get("created_at"), str):
-            data["created_at"] = datetime.fromisoformat(data["created_at"])
+            data["created_at"] = parse_datetime(data["created_at"])
         return cls(**data)
 
 
-@dataclass
+@dataclass(slots=True)
 class DownloadRecord:
     """下载记录数据模型"""
     message_id: int                         # 消息ID
@@ -124,24 +152,20 @@ class DownloadRecord:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = {name: getattr(self, name) for name in _RECORD_FIELDS}
         # 将 UTC 时间转换为东八区时间
-        if self.downloaded_at:
-            local_downloaded_at = to_local_time(self.downloaded_at)
-            data["downloaded_at"] = local_downloaded_at.isoformat()
-        else:
-            data["downloaded_at"] = None
+        data["downloaded_at"] = to_local_time(self.downloaded_at).isoformat() if self.downloaded_at else None
         return data
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "DownloadRecord":
         """从字典创建对象"""
         if isinstance(data.get("downloaded_at"), str):
-            data["downloaded_at"] = datetime.fromisoformat(data["downloaded_at"])
+            data["downloaded_at"] = parse_datetime(data["downloaded_at"])
         return cls(**data)
 
 
-@dataclass
+@dataclass(slots=True)
 class Comment:
     """评论数据模型"""
     id: int                                 # 评论消息ID
@@ -161,18 +185,27 @@ class Comment:
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
-        data = asdict(self)
+        data = {name: getattr(self, name) for name in _COMMENT_FIELDS}
         # 将 UTC 时间转换为东八区时间
-        if self.date:
-            local_date = to_local_time(self.date)
-            data["date"] = local_date.isoformat()
-        else:
-            data["date"] = None
+        data["date"] = to_local_time(self.date).isoformat() if self.date else None
         return data
-    
+
+    def to_dict_compact(self) -> Dict[str, Any]:
+        """转换为紧凑字典 (省略 None 和空串字段，JSONL 落盘用)"""
+        return {k: v for k, v in self.to_dict().items()
+                if v is not None and v != ""}
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "Comment":
         """从字典创建对象"""
         if isinstance(data.get("date"), str):
-            data["date"] = datetime.fromisoformat(data["date"])
+            data["date"] = parse_datetime(data["date"])
         return cls(**data)
+
+
+# 各模型的字段名元组: 模块载入时算一次，
+# to_dict 直接按名取属性，绕开 asdict 的递归遍历和深拷贝
+_MESSAGE_FIELDS = tuple(f.name for f in fields(Message))
+_CHAT_FIELDS = tuple(f.name for f in fields(Chat))
+_RECORD_FIELDS = tuple(f.name for f in fields(DownloadRecord))
+_COMMENT_FIELDS = tuple(f.name for f in fields(Comment))
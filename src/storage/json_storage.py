@@ -1,131 +1,258 @@
 """
 JSON 存储模块
 提供消息和元数据的 JSON 文件存储功能
+消息与评论采用 JSONL (每行一条记录) 追加写，单条保存成本 O(1)；
+元数据仍为普通 JSON 文件
 """
+import asyncio
 import json
 import aiofiles
+import aiofiles.os
 import os
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from ..models import Message, Chat, Comment
+from ..models import Message, Chat, Comment, dumps_json, loads_json
+
+# 批量编码超过这个条数就挪到线程做，orjson 编码时释放 GIL，
+# 事件循环可以继续收网络数据；小批量留在循环内免去线程派发开销
+_OFFLOAD_THRESHOLD = 32
+
+
+def _serialize_lines(dicts: List[Dict[str, Any]]) -> str:
+    """把字典列表编码成 JSONL 文本块"""
+    return "".join(dumps_json(d) + "\n" for d in dicts)
+
+
+async def _encode_batch(dicts: List[Dict[str, Any]]) -> str:
+    """按批量大小决定在事件循环内还是线程里做编码"""
+    if len(dicts) > _OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(_serialize_lines, dicts)
+    return _serialize_lines(dicts)
 
 
 class JSONStorage:
     """JSON 文件存储类"""
-    
+
     def __init__(self, output_dir: str = "output"):
         self.output_dir = Path(output_dir)
-    
+        # 每个聊天一个常驻追加句柄: 免去每批 open/close 的系统调用
+        self._msg_handles: dict = {}  # chat_id -> aiofiles 文件句柄
+        # 已见消息ID集合: 首次线性扫描一遍后，存在性检查变 O(1)
+        self._seen_ids: dict = {}  # chat_id -> set[int]
+        # 已创建目录集合: 每个目录只付一次 makedirs 系统调用
+        self._dirs_created: set = set()  # set[Path]
+
+    async def _ensure_dir(self, path: Path):
+        """创建目录 (带缓存，冷路径走异步 makedirs 不阻塞事件循环)"""
+        if path not in self._dirs_created:
+            await aiofiles.os.makedirs(path, exist_ok=True)
+            self._dirs_created.add(path)
+
     def _get_chat_dir(self, chat_id: int) -> Path:
         """获取聊天目录路径"""
         return self.output_dir / str(chat_id)
-    
+
     def _get_messages_file(self, chat_id: int) -> Path:
-        """获取消息文件路径"""
-        return self._get_chat_dir(chat_id) / "messages.json"
-    
+        """获取消息文件路径 (JSONL)"""
+        return self._get_chat_dir(chat_id) / "messages.jsonl"
+
     def _get_metadata_file(self, chat_id: int) -> Path:
         """获取元数据文件路径"""
         return self._get_chat_dir(chat_id) / "metadata.json"
-    
+
     def _get_comments_file(self, chat_id: int, parent_message_id: int) -> Path:
-        """获取评论文件路径"""
-        return self._get_chat_dir(chat_id) / "comments" / f"message_{parent_message_id}.json"
-    
+        """获取评论文件路径 (JSONL)"""
+        return self._get_chat_dir(chat_id) / "comments" / f"message_{parent_message_id}.jsonl"
+
+    @staticmethod
+    async def _migrate_legacy(jsonl_file: Path):
+        """
+        旧版 JSON 数组文件的一次性迁移
+        首次触达某个 .jsonl 路径时，如发现同名 .json 数组文件则逐条转为行并删除旧文件
+        """
+        if jsonl_file.exists():
+            return
+        legacy_file = jsonl_file.with_suffix(".json")
+        if not legacy_file.exists():
+            return
+
+        async with aiofiles.open(legacy_file, "r", encoding="utf-8") as f:
+            content = await f.read()
+        records = loads_json(content) if content.strip() else []
+
+        async with aiofiles.open(jsonl_file, "w", encoding="utf-8") as f:
+            await f.write("".join(dumps_json(r) + "\n" for r in records))
+        legacy_file.unlink()
+
+    async def _get_msg_handle(self, chat_id: int):
+        """获取消息文件的常驻追加句柄 (首次打开时完成建目录与旧格式迁移)"""
+        f = self._msg_handles.get(chat_id)
+        if f is None:
+            await self._ensure_dir(self._get_chat_dir(chat_id))
+            messages_file = self._get_messages_file(chat_id)
+            await self._migrate_legacy(messages_file)
+            f = await aiofiles.open(messages_file, "a", encoding="utf-8")
+            self._msg_handles[chat_id] = f
+        return f
+
+    async def aclose(self):
+        """关闭所有常驻文件句柄"""
+        handles = list(self._msg_handles.values())
+        self._msg_handles.clear()
+        for f in handles:
+            await f.close()
+
+    @staticmethod
+    async def _write_atomic(path: Path, content: str):
+        """
+        原子化整文件写入
+        先写临时文件再 os.replace，中断不会留下空/半截文件，
+        读方也不会在 \"w\" 截断后的瞬间读到零字节
+        """
+        tmp_file = path.with_suffix(path.suffix + ".tmp")
+        async with aiofiles.open(tmp_file, "w", encoding="utf-8") as f:
+            await f.write(content)
+        await aiofiles.os.replace(tmp_file, path)
+
+    @staticmethod
+    async def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+        """逐行读取 JSONL 文件"""
+        records = []
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            async for line in f:
+                if line.strip():
+                    records.append(loads_json(line))
+        return records
+
     async def save_message(self, message: Message):
-        """保存单条消息到 JSON 文件"""
-        chat_dir = self._get_chat_dir(message.chat_id)
-        chat_dir.mkdir(parents=True, exist_ok=True)
-        
-        messages_file = self._get_messages_file(message.chat_id)
-        
-        messages = []
-        if messages_file.exists():
-            async with aiofiles.open(messages_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if content.strip():
-                    messages = json.loads(content)
-        
-        messages.append(message.to_dict())
-        
-        async with aiofiles.open(messages_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(messages, ensure_ascii=False, indent=2))
-    
+        """保存单条消息 (JSONL 追加)"""
+        f = await self._get_msg_handle(message.chat_id)
+        await f.write(dumps_json(message.to_dict_compact()) + "\n")
+        await f.flush()
+
+        seen = self._seen_ids.get(message.chat_id)
+        if seen is not None:
+            seen.add(message.id)
+
     async def save_messages(self, messages: List[Message]):
-        """保存多条消息"""
+        """保存多条消息 (按聊天分组后每组一次批量追加，跨组并发)"""
+        if not messages:
+            return
+        by_chat: Dict[int, List[Dict[str, Any]]] = {}
         for msg in messages:
-            await self.save_message(msg)
-    
+            by_chat.setdefault(msg.chat_id, []).append(msg.to_dict_compact())
+        await asyncio.gather(*(
+            self.save_message_dicts(chat_id, dicts)
+            for chat_id, dicts in by_chat.items()
+        ))
+
+    async def save_message_dicts(self, chat_id: int, message_dicts: List[Dict[str, Any]]):
+        """批量追加已序列化的消息字典 (一次写入)"""
+        if not message_dicts:
+            return
+        f = await self._get_msg_handle(chat_id)
+        await f.write(await _encode_batch(message_dicts))
+        await f.flush()
+
+        seen = self._seen_ids.get(chat_id)
+        if seen is not None:
+            seen.update(d["id"] for d in message_dicts)
+
+    async def save_comment_dicts(self, chat_id: int, parent_id: int, comment_dicts: List[Dict[str, Any]]):
+        """批量追加已序列化的评论字典 (按父消息分文件)"""
+        if not comment_dicts:
+            return
+        await self._ensure_dir(self._get_chat_dir(chat_id) / "comments")
+
+        comments_file = self._get_comments_file(chat_id, parent_id)
+        await self._migrate_legacy(comments_file)
+
+        async with aiofiles.open(comments_file, "a", encoding="utf-8") as f:
+            await f.write(await _encode_batch(comment_dicts))
+
     async def get_messages(self, chat_id: int) -> List[Message]:
         """获取指定聊天的所有消息"""
         messages_file = self._get_messages_file(chat_id)
+        await self._migrate_legacy(messages_file)
         if not messages_file.exists():
             return []
-        
-        async with aiofiles.open(messages_file, "r", encoding="utf-8") as f:
-            content = await f.read()
-            if not content.strip():
-                return []
-            data = json.loads(content)
-            return [Message.from_dict(m) for m in data]
-    
+
+        data = await self._read_jsonl(messages_file)
+        return [Message.from_dict(m) for m in data]
+
+    async def _get_seen_ids(self, chat_id: int) -> set:
+        """获取已保存消息的ID集合 (每聊天只扫描文件一次，之后增量维护)"""
+        ids = self._seen_ids.get(chat_id)
+        if ids is None:
+            ids = set()
+            messages_file = self._get_messages_file(chat_id)
+            await self._migrate_legacy(messages_file)
+            if messages_file.exists():
+                async with aiofiles.open(messages_file, "r", encoding="utf-8") as f:
+                    async for line in f:
+                        if line.strip():
+                            ids.add(loads_json(line)["id"])
+            self._seen_ids[chat_id] = ids
+        return ids
+
     async def message_exists(self, message_id: int, chat_id: int) -> bool:
-        """检查消息是否已存在"""
-        messages = await self.get_messages(chat_id)
-        return any(m.id == message_id for m in messages)
-    
+        """检查消息是否已存在 (O(1) 集合判断)"""
+        return message_id in await self._get_seen_ids(chat_id)
+
     async def save_chat_metadata(self, chat: Chat):
         """保存聊天元数据"""
-        chat_dir = self._get_chat_dir(chat.id)
-        chat_dir.mkdir(parents=True, exist_ok=True)
-        
+        await self._ensure_dir(self._get_chat_dir(chat.id))
+
         metadata_file = self._get_metadata_file(chat.id)
-        async with aiofiles.open(metadata_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(chat.to_dict(), ensure_ascii=False, indent=2))
-    
+        await self._write_atomic(metadata_file, dumps_json(chat.to_dict(), indent=True))
+
+    async def update_chat_counters(self, chat_id: int, last_message_id: int, total_messages: int):
+        """只更新元数据中的计数字段"""
+        metadata_file = self._get_metadata_file(chat_id)
+        if not metadata_file.exists():
+            return
+
+        async with aiofiles.open(metadata_file, "r", encoding="utf-8") as f:
+            content = await f.read()
+        if not content.strip():
+            return
+
+        data = loads_json(content)
+        data["last_message_id"] = last_message_id
+        data["total_messages"] = total_messages
+
+        await self._write_atomic(metadata_file, dumps_json(data, indent=True))
+
     async def get_chat_metadata(self, chat_id: int) -> Optional[Chat]:
         """获取聊天元数据"""
         metadata_file = self._get_metadata_file(chat_id)
         if not metadata_file.exists():
             return None
-        
+
         async with aiofiles.open(metadata_file, "r", encoding="utf-8") as f:
             content = await f.read()
             if not content.strip():
                 return None
-            return Chat.from_dict(json.loads(content))
-    
+            return Chat.from_dict(loads_json(content))
+
     async def save_comment(self, comment: Comment):
-        """保存评论到 JSON 文件"""
-        chat_dir = self._get_chat_dir(comment.chat_id)
-        comments_dir = chat_dir / "comments"
-        comments_dir.mkdir(parents=True, exist_ok=True)
-        
+        """保存评论 (JSONL 追加)"""
+        await self._ensure_dir(self._get_chat_dir(comment.chat_id) / "comments")
+
         comments_file = self._get_comments_file(comment.chat_id, comment.parent_id)
-        
-        comments = []
-        if comments_file.exists():
-            async with aiofiles.open(comments_file, "r", encoding="utf-8") as f:
-                content = await f.read()
-                if content.strip():
-                    comments = json.loads(content)
-        
-        comments.append(comment.to_dict())
-        
-        async with aiofiles.open(comments_file, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(comments, ensure_ascii=False, indent=2))
-    
+        await self._migrate_legacy(comments_file)
+
+        async with aiofiles.open(comments_file, "a", encoding="utf-8") as f:
+            await f.write(dumps_json(comment.to_dict_compact()) + "\n")
+
     async def get_comments(self, chat_id: int, parent_message_id: int) -> List[Comment]:
         """获取指定消息的所有评论"""
         comments_file = self._get_comments_file(chat_id, parent_message_id)
+        await self._migrate_legacy(comments_file)
         if not comments_file.exists():
             return []
-        
-        async with aiofiles.open(comments_file, "r", encoding="utf-8") as f:
-            content = await f.read()
-            if not content.strip():
-                return []
-            data = json.loads(content)
-            return [Comment.from_dict(c) for c in data]
+
+        data = await self._read_jsonl(comments_file)
+        return [Comment.from_dict(c) for c in data]
@@ -3,274 +3,418 @@ SQLite 存储模块
 提供消息和元数据的 SQLite 数据库存储功能
 """
 import aiosqlite
+import asyncio
 import json
 import os
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from ..models import Message, Chat, DownloadRecord, Comment
+from ..models import Message, Chat, DownloadRecord, Comment, parse_datetime
+
+# 连接首次建立时执行一次的调优参数:
+# WAL + synchronous=NORMAL 把每次插入的 fsync 开销降到亚毫秒级，
+# 其余几项减少临时文件和页缓存的磁盘往返
+# synchronous 级别可通过构造参数覆盖 (对应 config.sqlite_synchronous)
+_CONN_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA busy_timeout=5000",
+)
+
+# 单事务最多写这么多行，超出就拆成多次提交，防止个别超大批次把 WAL 撑大
+_MAX_ROWS_PER_TXN = 500
+
+# 全表装载类查询的 fetchmany 块大小
+_FETCH_BLOCK = 5000
+
+# 热路径 INSERT 语句: 模块级常量保证 SQL 文本身份稳定，
+# sqlite3 的语句缓存按文本命中，免去逐次重新 parse/plan
+# upsert 用 ON CONFLICT DO UPDATE 而非 INSERT OR REPLACE:
+# 后者是删旧行+插新行，所有索引重写一遍；前者原地更新冲突行
+_SQL_INSERT_MESSAGE = """
+    INSERT INTO messages
+    (id, chat_id, date, text, raw_text, media_type, file_name, file_path, group_id,
+     sender_id, sender_name, is_reply, reply_to_msg_id, is_forward,
+     forward_from_chat_id, forward_from_msg_id, forward_from_name,
+     views, forwards, replies, is_discussion, discussion_chat_id, download_status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        text=excluded.text, raw_text=excluded.raw_text,
+        media_type=excluded.media_type, file_name=excluded.file_name,
+        file_path=excluded.file_path, group_id=excluded.group_id,
+        sender_id=excluded.sender_id, sender_name=excluded.sender_name,
+        is_reply=excluded.is_reply, reply_to_msg_id=excluded.reply_to_msg_id,
+        is_forward=excluded.is_forward,
+        forward_from_chat_id=excluded.forward_from_chat_id,
+        forward_from_msg_id=excluded.forward_from_msg_id,
+        forward_from_name=excluded.forward_from_name,
+        views=excluded.views, forwards=excluded.forwards,
+        replies=excluded.replies, is_discussion=excluded.is_discussion,
+        discussion_chat_id=excluded.discussion_chat_id,
+        download_status=excluded.download_status
+"""
+
+_SQL_INSERT_RECORD = """
+    INSERT INTO download_records
+    (message_id, chat_id, file_name, file_path, media_type, downloaded_at, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(chat_id, message_id, file_name) DO UPDATE SET
+        file_path=excluded.file_path, media_type=excluded.media_type,
+        downloaded_at=excluded.downloaded_at, status=excluded.status
+"""
+
+_SQL_INSERT_COMMENT = """
+    INSERT INTO comments
+    (id, chat_id, parent_id, date, text, raw_text, media_type, sender_id, sender_name, views)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(chat_id, id) DO UPDATE SET
+        text=excluded.text, raw_text=excluded.raw_text,
+        media_type=excluded.media_type, sender_id=excluded.sender_id,
+        sender_name=excluded.sender_name, views=excluded.views
+"""
+
+# created_at 不在更新列表里: 重复保存时保留首次入库的时间
+_SQL_INSERT_CHAT = """
+    INSERT INTO chats
+    (id, title, type, username, last_message_id, total_messages, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        title=excluded.title, type=excluded.type, username=excluded.username,
+        last_message_id=excluded.last_message_id,
+        total_messages=excluded.total_messages
+"""
+
+
+def _chunked(rows: list, size: int = _MAX_ROWS_PER_TXN):
+    """按固定大小切分参数列表"""
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
 
 
 class SQLiteStorage:
     """SQLite 数据库存储类"""
-    
-    def __init__(self, output_dir: str = "output"):
+
+    def __init__(self, output_dir: str = "output", synchronous: str = "NORMAL"):
         self.output_dir = Path(output_dir)
         self._db_path = None
-    
+        self._synchronous = synchronous
+        # 每个聊天一条常驻连接: 避免逐次调用的建连 + 隐式事务开销
+        self._connections: dict = {}  # chat_id -> aiosqlite.Connection
+        # 建连锁: 并发首触同一个库时只建一条连接、只跑一遍 DDL
+        self._conn_locks: dict = {}  # chat_id -> asyncio.Lock
+        # 已建表的聊天: init_db 每个库只真正执行一次 DDL
+        self._initialized: set = set()  # set[int]
+
     def _get_db_path(self, chat_id: int) -> Path:
         """获取数据库文件路径"""
         return self.output_dir / str(chat_id) / "messages.db"
-    
+
     async def _get_connection(self, chat_id: int):
-        """获取数据库连接"""
-        db_path = self._get_db_path(chat_id)
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-        conn = await aiosqlite.connect(str(db_path))
-        conn.row_factory = aiosqlite.Row
-        return conn
-    
-    async def init_db(self, chat_id: int):
-        """初始化数据库表结构"""
-        conn = await self._get_connection(chat_id)
-        try:
-            # 消息表 (增强版)
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY,
-                    chat_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    text TEXT DEFAULT '',
-                    raw_text TEXT DEFAULT '',
-                    media_type TEXT DEFAULT 'text',
-                    file_name TEXT,
-                    file_path TEXT,
-                    group_id INTEGER,
-                    sender_id INTEGER,
-                    sender_name TEXT,
-                    is_reply INTEGER DEFAULT 0,
-                    reply_to_msg_id INTEGER,
-                    is_forward INTEGER DEFAULT 0,
-                    forward_from_chat_id INTEGER,
-                    forward_from_msg_id INTEGER,
-                    forward_from_name TEXT,
-                    views INTEGER,
-                    forwards INTEGER,
-                    replies INTEGER,
-                    is_discussion INTEGER DEFAULT 0,
-                    discussion_chat_id INTEGER,
-                    download_status TEXT DEFAULT 'pending'
-                )
-            """)
-            
-            # 尝试添加 download_status 字段（如果表已存在）
-            try:
-                await conn.execute("ALTER TABLE messages ADD COLUMN download_status TEXT DEFAULT 'pending'")
-            except:
-                pass
-            # 聊天表
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS chats (
-                    id INTEGER PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    type TEXT NOT NULL,
-                    username TEXT,
-                    last_message_id INTEGER DEFAULT 0,
-                    total_messages INTEGER DEFAULT 0,
-                    created_at TEXT NOT NULL
-                )
-            """)
-            # 下载记录表
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS download_records (
-                    message_id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    file_name TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    media_type TEXT NOT NULL,
-                    downloaded_at TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    PRIMARY KEY (chat_id, message_id, file_name)
-                )
-            """)
-            
-            # 尝试添加 status 字段（如果表已存在）
+        """获取数据库连接 (常驻缓存，首次打开时设置 PRAGMA 并建表)"""
+        conn = self._connections.get(chat_id)
+        if conn is not None:
+            return conn
+
+        # 并发首触同一个库时按聊天加锁: 只建一条连接，
+        # 且 DDL 跑完才发布，其他任务拿不到半初始化的连接
+        lock = self._conn_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            conn = self._connections.get(chat_id)
+            if conn is not None:
+                return conn
+
+            db_path = self._get_db_path(chat_id)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            # 放大语句缓存 (默认 100): 本模块反复使用的 SQL 全部常驻缓存
+            conn = await aiosqlite.connect(str(db_path), cached_statements=256)
+            conn.row_factory = aiosqlite.Row
+            for pragma in _CONN_PRAGMAS:
+                await conn.execute(pragma)
+            await conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            # 首开连接时顺带建表，之后所有方法直接用连接，不再逐次跑 DDL
+            await self._create_schema(conn)
+            self._initialized.add(chat_id)
+            self._connections[chat_id] = conn
+            return conn
+
+    async def close(self):
+        """关闭所有常驻连接 (关闭前跑 PRAGMA optimize 更新查询规划统计)"""
+        conns = list(self._connections.values())
+        self._connections.clear()
+        for conn in conns:
             try:
-                await conn.execute("ALTER TABLE download_records ADD COLUMN status TEXT DEFAULT 'pending'")
-            except:
+                # 本次会话写入量大时顺带做必要的 ANALYZE，后续查询规划更准
+                await conn.execute("PRAGMA optimize")
+            except Exception:
                 pass
-            # 评论表
-            await conn.execute("""
-                CREATE TABLE IF NOT EXISTS comments (
-                    id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    parent_id INTEGER NOT NULL,
-                    date TEXT NOT NULL,
-                    text TEXT DEFAULT '',
-                    raw_text TEXT DEFAULT '',
-                    media_type TEXT DEFAULT 'text',
-                    sender_id INTEGER,
-                    sender_name TEXT,
-                    views INTEGER,
-                    PRIMARY KEY (chat_id, id)
-                )
-            """)
-            # 创建索引
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages(chat_id)
-            """)
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_download_records_chat_id ON download_records(chat_id)
-            """)
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_comments_chat_id ON comments(chat_id)
-            """)
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_comments_parent_id ON comments(parent_id)
-            """)
-            await conn.commit()
-        finally:
             await conn.close()
-    
+
+    async def init_db(self, chat_id: int):
+        """初始化数据库表结构 (每个库只执行一次，重复调用直接返回)"""
+        if chat_id in self._initialized:
+            return
+        # 建连时会跑 _create_schema 并标记 _initialized
+        await self._get_connection(chat_id)
+
+    @staticmethod
+    async def _create_schema(conn):
+        """建表/建索引 (由 _get_connection 在首开连接时调用一次)"""
+        # 消息表 (增强版)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                text TEXT DEFAULT '',
+                raw_text TEXT DEFAULT '',
+                media_type TEXT DEFAULT 'text',
+                file_name TEXT,
+                file_path TEXT,
+                group_id INTEGER,
+                sender_id INTEGER,
+                sender_name TEXT,
+                is_reply INTEGER DEFAULT 0,
+                reply_to_msg_id INTEGER,
+                is_forward INTEGER DEFAULT 0,
+                forward_from_chat_id INTEGER,
+                forward_from_msg_id INTEGER,
+                forward_from_name TEXT,
+                views INTEGER,
+                forwards INTEGER,
+                replies INTEGER,
+                is_discussion INTEGER DEFAULT 0,
+                discussion_chat_id INTEGER,
+                download_status TEXT DEFAULT 'pending'
+            )
+        """)
+
+        # 尝试添加 download_status 字段（如果表已存在）
+        try:
+            await conn.execute("ALTER TABLE messages ADD COLUMN download_status TEXT DEFAULT 'pending'")
+        except:
+            pass
+        # 聊天表
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS chats (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                type TEXT NOT NULL,
+                username TEXT,
+                last_message_id INTEGER DEFAULT 0,
+                total_messages INTEGER DEFAULT 0,
+                created_at TEXT NOT NULL
+            )
+        """)
+        # 下载记录表
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS download_records (
+                message_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                file_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                downloaded_at TEXT NOT NULL,
+                status TEXT DEFAULT 'pending',
+                PRIMARY KEY (chat_id, message_id, file_name)
+            ) WITHOUT ROWID
+        """)
+
+        # 尝试添加 status 字段（如果表已存在）
+        try:
+            await conn.execute("ALTER TABLE download_records ADD COLUMN status TEXT DEFAULT 'pending'")
+        except:
+            pass
+        # 评论表
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS comments (
+                id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                parent_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                text TEXT DEFAULT '',
+                raw_text TEXT DEFAULT '',
+                media_type TEXT DEFAULT 'text',
+                sender_id INTEGER,
+                sender_name TEXT,
+                views INTEGER,
+                PRIMARY KEY (chat_id, id)
+            ) WITHOUT ROWID
+        """)
+        # 创建索引
+        # (chat_id, id) 复合索引: get_all_message_ids / get_statuses_for
+        # 这类只按ID过滤的查询走索引，不用再回表读整行
+        await conn.execute("""
+            DROP INDEX IF EXISTS idx_messages_chat_id
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_messages_chat_id_id ON messages(chat_id, id)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_download_records_chat_id ON download_records(chat_id)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_comments_chat_id ON comments(chat_id)
+        """)
+        await conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_comments_parent_id ON comments(parent_id)
+        """)
+        await conn.commit()
+
+    @staticmethod
+    def _message_row(message: Message) -> tuple:
+        """构造消息表的绑定参数元组"""
+        return (
+            message.id,
+            message.chat_id,
+            message.date.isoformat() if message.date else datetime.now().isoformat(),
+            message.text,
+            message.raw_text,
+            message.media_type,
+            message.file_name,
+            message.file_path,
+            message.group_id,
+            message.sender_id,
+            message.sender_name,
+            int(message.is_reply),
+            message.reply_to_msg_id,
+            int(message.is_forward),
+            message.forward_from_chat_id,
+            message.forward_from_msg_id,
+            message.forward_from_name,
+            message.views,
+            message.forwards,
+            message.replies if hasattr(message, 'replies') else None,
+            int(message.is_discussion),
+            message.discussion_chat_id,
+            getattr(message, 'download_status', 'pending')
+        )
+
+    @staticmethod
+    def _record_row(record: DownloadRecord) -> tuple:
+        """构造下载记录表的绑定参数元组"""
+        return (
+            record.message_id,
+            record.chat_id,
+            record.file_name,
+            record.file_path,
+            record.media_type,
+            record.downloaded_at.isoformat(),
+            getattr(record, 'status', 'pending')
+        )
+
+    @staticmethod
+    def _comment_row(comment: Comment) -> tuple:
+        """构造评论表的绑定参数元组"""
+        return (
+            comment.id,
+            comment.chat_id,
+            comment.parent_id,
+            comment.date.isoformat() if comment.date else datetime.now().isoformat(),
+            comment.text,
+            comment.raw_text,
+            comment.media_type,
+            comment.sender_id,
+            comment.sender_name,
+            comment.views
+        )
+
     async def save_message(self, message: Message):
         """保存单条消息 (upsert 模式)"""
-        await self.init_db(message.chat_id)
         conn = await self._get_connection(message.chat_id)
-        try:
-            await conn.execute("""
-                INSERT OR REPLACE INTO messages 
-                (id, chat_id, date, text, raw_text, media_type, file_name, file_path, group_id,
-                 sender_id, sender_name, is_reply, reply_to_msg_id, is_forward,
-                 forward_from_chat_id, forward_from_msg_id, forward_from_name,
-                 views, forwards, replies, is_discussion, discussion_chat_id, download_status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                message.id,
-                message.chat_id,
-                message.date.isoformat() if message.date else datetime.now().isoformat(),
-                message.text,
-                message.raw_text,
-                message.media_type,
-                message.file_name,
-                message.file_path,
-                message.group_id,
-                message.sender_id,
-                message.sender_name,
-                int(message.is_reply),
-                message.reply_to_msg_id,
-                int(message.is_forward),
-                message.forward_from_chat_id,
-                message.forward_from_msg_id,
-                message.forward_from_name,
-                message.views,
-                message.forwards,
-                message.replies if hasattr(message, 'replies') else None,
-                int(message.is_discussion),
-                message.discussion_chat_id,
-                getattr(message, 'download_status', 'pending')
-            ))
-            await conn.commit()
-        finally:
-            await conn.close()
-    
-    async def save_messages(self, messages: List[Message]):
-        """批量保存消息"""
-        if not messages:
+        await conn.execute(_SQL_INSERT_MESSAGE, self._message_row(message))
+        await conn.commit()
+
+    async def save_messages_bulk(
+        self,
+        messages: List[Message],
+        records: Optional[List[DownloadRecord]] = None,
+        comments: Optional[List[Comment]] = None
+    ):
+        """
+        批量保存消息/下载记录/评论 (按批事务)
+        每最多 500 行 COMMIT 一次，而不是每行一次 fsync
+        """
+        records = records or []
+        comments = comments or []
+        if not messages and not records and not comments:
             return
-        
-        chat_id = messages[0].chat_id
-        await self.init_db(chat_id)
+
+        chat_id = (messages[0].chat_id if messages
+                   else records[0].chat_id if records
+                   else comments[0].chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            for message in messages:
-                await conn.execute("""
-                    INSERT OR REPLACE INTO messages 
-                    (id, chat_id, date, text, raw_text, media_type, file_name, file_path, group_id,
-                     sender_id, sender_name, is_reply, reply_to_msg_id, is_forward,
-                     forward_from_chat_id, forward_from_msg_id, forward_from_name,
-                     views, forwards, replies, is_discussion, discussion_chat_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    message.id,
-                    message.chat_id,
-                    message.date.isoformat() if message.date else datetime.now().isoformat(),
-                    message.text,
-                    message.raw_text,
-                    message.media_type,
-                    message.file_name,
-                    message.file_path,
-                    message.group_id,
-                    message.sender_id,
-                    message.sender_name,
-                    int(message.is_reply),
-                    message.reply_to_msg_id,
-                    int(message.is_forward),
-                    message.forward_from_chat_id,
-                    message.forward_from_msg_id,
-                    message.forward_from_name,
-                    message.views,
-                    message.forwards,
-                    message.replies if hasattr(message, 'replies') else None,
-                    int(message.is_discussion),
-                    message.discussion_chat_id
-                ))
-            await conn.commit()
-        finally:
-            await conn.close()
-    
+        if messages:
+            for rows in _chunked([self._message_row(m) for m in messages]):
+                await conn.executemany(_SQL_INSERT_MESSAGE, rows)
+                await conn.commit()
+        if records:
+            for rows in _chunked([self._record_row(r) for r in records]):
+                await conn.executemany(_SQL_INSERT_RECORD, rows)
+                await conn.commit()
+        if comments:
+            for rows in _chunked([self._comment_row(c) for c in comments]):
+                await conn.executemany(_SQL_INSERT_COMMENT, rows)
+                await conn.commit()
+
+    async def save_messages(self, messages: List[Message]):
+        """批量保存消息 (复用 executemany 批量路径)"""
+        await self.save_messages_bulk(messages)
+
     async def get_messages(self, chat_id: int) -> List[Message]:
-        """获取指定聊天的所有消息"""
-        await self.init_db(chat_id)
+        """
+        获取指定聊天的所有消息
+        fetchmany 分块装载 + 显式列序按位解包:
+        大表不一次性持有全部 Row 对象，也免去每行 23 次按列名查字典
+        """
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT * FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
-            ) as cursor:
-                rows = await cursor.fetchall()
-                messages = []
-                for row in rows:
+        messages = []
+        async with conn.execute(
+            "SELECT id, chat_id, date, text, raw_text, media_type, file_name, file_path, group_id, "
+            "sender_id, sender_name, is_reply, reply_to_msg_id, is_forward, "
+            "forward_from_chat_id, forward_from_msg_id, forward_from_name, "
+            "views, forwards, replies, is_discussion, discussion_chat_id, download_status "
+            "FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
+        ) as cursor:
+            cursor.arraysize = _FETCH_BLOCK
+            while True:
+                rows = await cursor.fetchmany()
+                if not rows:
+                    break
+                for (mid, cid, date, text, raw_text, media_type, file_name,
+                     file_path, group_id, sender_id, sender_name, is_reply,
+                     reply_to_msg_id, is_forward, fwd_chat_id, fwd_msg_id,
+                     fwd_name, views, forwards, replies, is_discussion,
+                     discussion_chat_id, download_status) in rows:
                     messages.append(Message(
-                        id=row["id"],
-                        chat_id=row["chat_id"],
-                        date=datetime.fromisoformat(row["date"]),
-                        text=row["text"],
-                        raw_text=row["raw_text"] or "",
-                        media_type=row["media_type"],
-                        file_name=row["file_name"],
-                        file_path=row["file_path"],
-                        group_id=row["group_id"],
-                        sender_id=row["sender_id"],
-                        sender_name=row["sender_name"],
-                        is_reply=bool(row["is_reply"]),
-                        reply_to_msg_id=row["reply_to_msg_id"],
-                        is_forward=bool(row["is_forward"]),
-                        forward_from_chat_id=row["forward_from_chat_id"],
-                        forward_from_msg_id=row["forward_from_msg_id"],
-                        forward_from_name=row["forward_from_name"],
-                        views=row["views"],
-                        forwards=row["forwards"],
-                        replies=row["replies"],
-                        is_discussion=bool(row["is_discussion"]),
-                        discussion_chat_id=row["discussion_chat_id"]
+                        id=mid,
+                        chat_id=cid,
+                        date=parse_datetime(date),
+                        text=text,
+                        raw_text=raw_text or "",
+                        media_type=media_type,
+                        file_name=file_name,
+                        file_path=file_path,
+                        group_id=group_id,
+                        sender_id=sender_id,
+                        sender_name=sender_name,
+                        is_reply=bool(is_reply),
+                        reply_to_msg_id=reply_to_msg_id,
+                        is_forward=bool(is_forward),
+                        forward_from_chat_id=fwd_chat_id,
+                        forward_from_msg_id=fwd_msg_id,
+                        forward_from_name=fwd_name,
+                        views=views,
+                        forwards=forwards,
+                        replies=replies,
+                        is_discussion=bool(is_discussion),
+                        discussion_chat_id=discussion_chat_id,
+                        download_status=download_status or "pending"
                     ))
-                return messages
-        finally:
-            await conn.close()
-    
-    async def message_exists(self, message_id: int, chat_id: int) -> bool:
-        """检查消息是否已存在"""
-        await self.init_db(chat_id)
-        conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT 1 FROM messages WHERE id = ? AND chat_id = ? LIMIT 1",
-                (message_id, chat_id)
-            ) as cursor:
-                return await cursor.fetchone() is not None
-        finally:
-            await conn.close()
-    
+        return messages
+
     async def is_message_download_complete(self, message_id: int, chat_id: int) -> bool:
         """
         检查消息是否完全下载完成
@@ -278,212 +422,227 @@ class SQLiteStorage:
         1. 消息存在于数据库
         2. download_status = 'completed' 或 download_status IS NULL（旧数据兼容）
         """
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT download_status FROM messages WHERE id = ? AND chat_id = ? LIMIT 1",
-                (message_id, chat_id)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row is None:
-                    return False
-                status = row["download_status"]
-                # NULL 也视为已完成（兼容旧数据）
-                return status == "completed" or status is None
-        finally:
-            await conn.close()
-    
+        async with conn.execute(
+            "SELECT download_status FROM messages WHERE id = ? AND chat_id = ? LIMIT 1",
+            (message_id, chat_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+            if row is None:
+                return False
+            status = row["download_status"]
+            # NULL 也视为已完成（兼容旧数据）
+            return status == "completed" or status is None
+
     async def get_message_download_status(self, message_id: int, chat_id: int) -> Optional[str]:
         """获取消息的下载状态"""
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
+        async with conn.execute(
+            "SELECT download_status FROM messages WHERE id = ? AND chat_id = ? LIMIT 1",
+            (message_id, chat_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+            if row:
+                return row["download_status"]
+            return None
+
+    async def get_all_message_ids(self, chat_id: int) -> frozenset:
+        """获取所有消息ID集合 (fetchmany 分块装载，大表不占双倍内存)"""
+        conn = await self._get_connection(chat_id)
+        ids = set()
+        async with conn.execute(
+            "SELECT id FROM messages WHERE chat_id = ?", (chat_id,)
+        ) as cursor:
+            cursor.arraysize = _FETCH_BLOCK
+            while True:
+                rows = await cursor.fetchmany()
+                if not rows:
+                    break
+                ids.update(row[0] for row in rows)
+        # frozenset 定型后成员判断不再受后续扩容影响
+        return frozenset(ids)
+
+    async def get_statuses_for(self, chat_id: int, message_ids: List[int]) -> dict:
+        """
+        查询给定ID的下载状态 (IN 查询，按 500 个ID一批)
+        返回: {message_id: download_status}，不存在的ID不在结果中
+        """
+        if not message_ids:
+            return {}
+        conn = await self._get_connection(chat_id)
+        statuses = {}
+        for ids in _chunked(list(message_ids)):
+            placeholders = ",".join("?" * len(ids))
             async with conn.execute(
-                "SELECT download_status FROM messages WHERE id = ? AND chat_id = ? LIMIT 1",
-                (message_id, chat_id)
+                f"SELECT id, download_status FROM messages WHERE chat_id = ? AND id IN ({placeholders})",
+                (chat_id, *ids)
             ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    return row["download_status"]
-                return None
-        finally:
-            await conn.close()
-    
-    async def get_all_message_ids(self, chat_id: int) -> set:
-        """获取所有消息ID集合"""
-        await self.init_db(chat_id)
+                rows = await cursor.fetchall()
+                statuses.update((row[0], row[1]) for row in rows)
+        return statuses
+
+    async def get_record_statuses_for(self, chat_id: int, message_ids: List[int]) -> dict:
+        """
+        批量查询给定消息ID的下载记录状态 (IN 查询，按 500 个ID一批)
+        返回: {(message_id, file_name): status}，没有记录的ID不在结果中
+        """
+        if not message_ids:
+            return {}
         conn = await self._get_connection(chat_id)
-        try:
+        statuses = {}
+        for ids in _chunked(list(message_ids)):
+            placeholders = ",".join("?" * len(ids))
             async with conn.execute(
-                "SELECT id FROM messages WHERE chat_id = ?", (chat_id,)
+                f"SELECT message_id, file_name, status FROM download_records "
+                f"WHERE chat_id = ? AND message_id IN ({placeholders})",
+                (chat_id, *ids)
             ) as cursor:
                 rows = await cursor.fetchall()
-                return {row["id"] for row in rows}
-        finally:
-            await conn.close()
-    
+                statuses.update(((row[0], row[1]), row[2]) for row in rows)
+        return statuses
+
     async def get_all_message_statuses(self, chat_id: int) -> dict:
         """
         批量获取所有消息的下载状态
         返回: {message_id: download_status}
         """
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT id, download_status FROM messages WHERE chat_id = ?", (chat_id,)
-            ) as cursor:
-                rows = await cursor.fetchall()
-                return {row["id"]: row["download_status"] for row in rows}
-        finally:
-            await conn.close()
-    
+        statuses = {}
+        async with conn.execute(
+            "SELECT id, download_status FROM messages WHERE chat_id = ?", (chat_id,)
+        ) as cursor:
+            cursor.arraysize = _FETCH_BLOCK
+            while True:
+                rows = await cursor.fetchmany()
+                if not rows:
+                    break
+                for mid, status in rows:
+                    statuses[mid] = status
+        return statuses
+
     async def save_chat(self, chat: Chat):
         """保存聊天信息"""
-        await self.init_db(chat.id)
         conn = await self._get_connection(chat.id)
-        try:
-            await conn.execute("""
-                INSERT OR REPLACE INTO chats 
-                (id, title, type, username, last_message_id, total_messages, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                chat.id,
-                chat.title,
-                chat.type,
-                chat.username,
-                chat.last_message_id,
-                chat.total_messages,
-                chat.created_at.isoformat()
-            ))
-            await conn.commit()
-        finally:
-            await conn.close()
-    
+        await conn.execute(_SQL_INSERT_CHAT, (
+            chat.id,
+            chat.title,
+            chat.type,
+            chat.username,
+            chat.last_message_id,
+            chat.total_messages,
+            chat.created_at.isoformat()
+        ))
+        await conn.commit()
+
+    async def update_chat_counters(self, chat_id: int, last_message_id: int, total_messages: int):
+        """只更新聊天的计数字段，不重写整行"""
+        conn = await self._get_connection(chat_id)
+        await conn.execute(
+            "UPDATE chats SET last_message_id = ?, total_messages = ? WHERE id = ?",
+            (last_message_id, total_messages, chat_id)
+        )
+        await conn.commit()
+
     async def get_chat(self, chat_id: int) -> Optional[Chat]:
         """获取聊天信息"""
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT * FROM chats WHERE id = ?", (chat_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if not row:
-                    return None
-                return Chat(
-                    id=row["id"],
-                    title=row["title"],
-                    type=row["type"],
-                    username=row["username"],
-                    last_message_id=row["last_message_id"],
-                    total_messages=row["total_messages"],
-                    created_at=datetime.fromisoformat(row["created_at"])
-                )
-        finally:
-            await conn.close()
-    
+        async with conn.execute(
+            "SELECT * FROM chats WHERE id = ?", (chat_id,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            if not row:
+                return None
+            return Chat(
+                id=row["id"],
+                title=row["title"],
+                type=row["type"],
+                username=row["username"],
+                last_message_id=row["last_message_id"],
+                total_messages=row["total_messages"],
+                created_at=datetime.fromisoformat(row["created_at"])
+            )
+
     async def save_download_record(self, record: DownloadRecord):
         """保存下载记录"""
-        await self.init_db(record.chat_id)
         conn = await self._get_connection(record.chat_id)
-        try:
-            await conn.execute("""
-                INSERT OR REPLACE INTO download_records 
-                (message_id, chat_id, file_name, file_path, media_type, downloaded_at, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                record.message_id,
-                record.chat_id,
-                record.file_name,
-                record.file_path,
-                record.media_type,
-                record.downloaded_at.isoformat(),
-                getattr(record, 'status', 'pending')
-            ))
-            await conn.commit()
-        finally:
-            await conn.close()
-    
+        await conn.execute(_SQL_INSERT_RECORD, (
+            record.message_id,
+            record.chat_id,
+            record.file_name,
+            record.file_path,
+            record.media_type,
+            record.downloaded_at.isoformat(),
+            getattr(record, 'status', 'pending')
+        ))
+        await conn.commit()
+
     async def get_download_record_status(self, message_id: int, chat_id: int, file_name: str) -> Optional[str]:
         """获取下载记录的状态"""
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT status FROM download_records WHERE message_id = ? AND chat_id = ? AND file_name = ?",
-                (message_id, chat_id, file_name)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    return row["status"]
-                return None
-        finally:
-            await conn.close()
-    
+        async with conn.execute(
+            "SELECT status FROM download_records WHERE message_id = ? AND chat_id = ? AND file_name = ?",
+            (message_id, chat_id, file_name)
+        ) as cursor:
+            row = await cursor.fetchone()
+            if row:
+                return row["status"]
+            return None
+
     async def download_record_exists(self, message_id: int, chat_id: int, file_name: str) -> bool:
         """检查下载记录是否存在"""
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT 1 FROM download_records WHERE message_id = ? AND chat_id = ? AND file_name = ?",
-                (message_id, chat_id, file_name)
-            ) as cursor:
-                return await cursor.fetchone() is not None
-        finally:
-            await conn.close()
-    
+        async with conn.execute(
+            "SELECT 1 FROM download_records WHERE message_id = ? AND chat_id = ? AND file_name = ?",
+            (message_id, chat_id, file_name)
+        ) as cursor:
+            return await cursor.fetchone() is not None
+
     async def save_comment(self, comment: Comment):
         """保存评论"""
-        await self.init_db(comment.chat_id)
         conn = await self._get_connection(comment.chat_id)
-        try:
-            await conn.execute("""
-                INSERT OR REPLACE INTO comments 
-                (id, chat_id, parent_id, date, text, raw_text, media_type, sender_id, sender_name, views)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                comment.id,
-                comment.chat_id,
-                comment.parent_id,
-                comment.date.isoformat() if comment.date else datetime.now().isoformat(),
-                comment.text,
-                comment.raw_text,
-                comment.media_type,
-                comment.sender_id,
-                comment.sender_name,
-                comment.views
-            ))
-            await conn.commit()
-        finally:
-            await conn.close()
-    
+        await conn.execute(_SQL_INSERT_COMMENT, (
+            comment.id,
+            comment.chat_id,
+            comment.parent_id,
+            comment.date.isoformat() if comment.date else datetime.now().isoformat(),
+            comment.text,
+            comment.raw_text,
+            comment.media_type,
+            comment.sender_id,
+            comment.sender_name,
+            comment.views
+        ))
+        await conn.commit()
+
+    async def export_snapshot(self, chat_id: int, dst_path: str):
+        """
+        导出数据库快照到指定路径 (目标文件不能已存在)
+        VACUUM INTO 在 SQLite 内部做页级拷贝并顺带紧缩，
+        比逐行读进 Python 再写出快一个量级，且保留全部索引
+        """
+        conn = await self._get_connection(chat_id)
+        await conn.execute("VACUUM INTO ?", (str(dst_path),))
+
     async def get_comments(self, chat_id: int, parent_message_id: int) -> List[Comment]:
         """获取指定消息的所有评论"""
-        await self.init_db(chat_id)
         conn = await self._get_connection(chat_id)
-        try:
-            async with conn.execute(
-                "SELECT * FROM comments WHERE chat_id = ? AND parent_id = ? ORDER BY id",
-                (chat_id, parent_message_id)
-            ) as cursor:
-                rows = await cursor.fetchall()
-                comments = []
-                for row in rows:
-                    comments.append(Comment(
-                        id=row["id"],
-                        chat_id=row["chat_id"],
-                        parent_id=row["parent_id"],
-                        date=datetime.fromisoformat(row["date"]),
-                        text=row["text"],
-                        raw_text=row["raw_text"] or "",
-                        media_type=row["media_type"],
-                        sender_id=row["sender_id"],
-                        sender_name=row["sender_name"],
-                        views=row["views"]
-                    ))
-                return comments
-        finally:
-            await conn.close()
+        async with conn.execute(
+            "SELECT * FROM comments WHERE chat_id = ? AND parent_id = ? ORDER BY id",
+            (chat_id, parent_message_id)
+        ) as cursor:
+            rows = await cursor.fetchall()
+            comments = []
+            for row in rows:
+                comments.append(Comment(
+                    id=row["id"],
+                    chat_id=row["chat_id"],
+                    parent_id=row["parent_id"],
+                    date=datetime.fromisoformat(row["date"]),
+                    text=row["text"],
+                    raw_text=row["raw_text"] or "",
+                    media_type=row["media_type"],
+                    sender_id=row["sender_id"],
+                    sender_name=row["sender_name"],
+                    views=row["views"]
+                ))
+            return comments
@@ -0,0 +1,92 @@
+"""
+统一存储模块
+把 JSON 和 SQLite 两个后端收拢到一条写路径：模型只序列化一次，
+写入按批刷盘 (SQLite 单事务 + JSON 单次读写)
+"""
+import logging
+from collections import defaultdict
+from typing import List, Optional
+
+from ..models import Message, Chat, DownloadRecord, Comment
+from .json_storage import JSONStorage
+from .sqlite_storage import SQLiteStorage
+
+log = logging.getLogger("UnifiedStorage")
+
+
+class UnifiedStorage:
+    """JSON + SQLite 双后端的批量写入包装"""
+
+    def __init__(self, output_dir: str = "output", sqlite_synchronous: str = "NORMAL"):
+        self.json_storage = JSONStorage(output_dir)
+        self.sqlite_storage = SQLiteStorage(output_dir, synchronous=sqlite_synchronous)
+        self._pending_msgs: List[Message] = []
+        self._pending_records: List[DownloadRecord] = []
+        self._pending_comments: List[Comment] = []
+
+    def queue_message(self, message: Message):
+        """消息入待写队列"""
+        self._pending_msgs.append(message)
+
+    def queue_record(self, record: DownloadRecord):
+        """下载记录入待写队列"""
+        self._pending_records.append(record)
+
+    def queue_comment(self, comment: Comment):
+        """评论入待写队列"""
+        self._pending_comments.append(comment)
+
+    def queue_comments(self, comments: List[Comment]):
+        """批量评论入待写队列"""
+        self._pending_comments.extend(comments)
+
+    async def flush(self):
+        """
+        刷出所有待写数据
+        每个模型只调一次 to_dict，产物同时供 JSON 后端使用；
+        SQLite 侧单事务批量提交
+        """
+        if not (self._pending_msgs or self._pending_records or self._pending_comments):
+            return
+
+        msgs = self._pending_msgs
+        records = self._pending_records
+        comments = self._pending_comments
+        self._pending_msgs = []
+        self._pending_records = []
+        self._pending_comments = []
+
+        # SQLite: 每个聊天一个事务 (多聊天并发时队列可能混有不同聊天)
+        by_chat = defaultdict(lambda: ([], [], []))
+        for m in msgs:
+            by_chat[m.chat_id][0].append(m)
+        for r in records:
+            by_chat[r.chat_id][1].append(r)
+        for c in comments:
+            by_chat[c.chat_id][2].append(c)
+        for chat_msgs, chat_records, chat_comments in by_chat.values():
+            await self.sqlite_storage.save_messages_bulk(chat_msgs, chat_records, chat_comments)
+
+        # JSON: 每个聊天一次读写 (紧凑字典省掉空字段)；评论按父消息分组
+        msgs_by_chat = defaultdict(list)
+        for m in msgs:
+            msgs_by_chat[m.chat_id].append(m.to_dict_compact())
+        for cid, dicts in msgs_by_chat.items():
+            await self.json_storage.save_message_dicts(cid, dicts)
+
+        comments_by_parent = defaultdict(list)
+        for c in comments:
+            comments_by_parent[(c.chat_id, c.parent_id)].append(c.to_dict_compact())
+        for (cid, pid), dicts in comments_by_parent.items():
+            await self.json_storage.save_comment_dicts(cid, pid, dicts)
+
+    async def save_chat(self, chat: Chat):
+        """保存聊天信息到两个后端"""
+        await self.json_storage.save_chat_metadata(chat)
+        await self.sqlite_storage.save_chat(chat)
+
+    async def aclose(self):
+        """刷出残留数据并关闭两个后端的常驻句柄/连接"""
+        await self.flush()
+        await self.json_storage.aclose()
+        await self.sqlite_storage.close()